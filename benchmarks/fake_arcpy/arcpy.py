@@ -0,0 +1,557 @@
+### Lightweight stand-in for the parts of arcpy the rtkMachine uses, so it can be benchmarked on machines without ArcGIS Pro (for example Linux CI).
+# Feature classes and tables are kept in memory in _datasets, keyed by their path. Every geoprocessing tool output is also added to the fake active map as a layer,
+# like ArcGIS Pro does, so the layer removal stages have something to remove. Coordinates are always treated as WGS84; spatial_reference arguments are accepted and ignored.
+# This is not a geometry engine: centroids are planar, label points are simple, and GenerateNearTable uses a spherical distance. It only needs to exercise the same calls with the same data shapes.
+
+import os
+import pickle
+import re
+import types
+import numpy as np
+
+_datasets = {} # normalized path -> dataset dict
+call_counts = {} # tool name -> number of calls, for the benchmark report
+
+# when set to a folder, every dataset a tool creates is also pickled there, to give tool outputs a disk write cost like a file gdb
+write_through_folder = None
+
+EARTH_RADIUS = 6371008.8
+
+def reset():
+    _datasets.clear()
+    call_counts.clear()
+    _map.layers.clear()
+    return
+
+def _count(name):
+    call_counts[name] = call_counts.get(name, 0) + 1
+    return
+
+def _key(path):
+    return str(path).replace('\\', '/').lower()
+
+def _basename(path):
+    return str(path).replace('\\', '/').split('/')[-1]
+
+### geometry
+
+class Point:
+    def __init__(self, X, Y):
+        self.X = float(X)
+        self.Y = float(Y)
+
+class Geometry:
+
+    # parts is a list of lists of Point, with None between the rings of a polygon part, like arcpy geometries iterate
+    def __init__(self, shape_type, parts):
+        self.type = shape_type.lower()
+        self.parts = parts
+
+    def __iter__(self):
+        return iter(self.parts)
+
+    def _rings(self):
+        # every ring (or line) as an (n, 2) array, with whether it is an exterior ring. The first ring of each part is its exterior, the rings after it are holes.
+        rings = []
+        for part in self.parts:
+            ring, ring_idx = [], 0
+            for point in list(part) + [None]:
+                if point is not None:
+                    ring.append((point.X, point.Y))
+                elif len(ring) > 0:
+                    rings.append((np.array(ring, dtype = np.float64), ring_idx == 0))
+                    ring, ring_idx = [], ring_idx + 1
+        return rings
+
+    @property
+    def trueCentroid(self):
+        # the center of gravity: area-weighted for polygons (holes taken away), length-weighted for lines, and the mean of the points otherwise
+        rings = self._rings()
+        vertices = np.concatenate([ring for ring, exterior in rings])
+        if self.type == 'polyline':
+            starts = np.concatenate([ring[:-1] for ring, exterior in rings])
+            ends = np.concatenate([ring[1:] for ring, exterior in rings])
+            lengths = np.hypot(*(ends - starts).T)
+            if lengths.sum() > 0:
+                return Point(*(((starts + ends) / 2 * lengths[:, None]).sum(axis = 0) / lengths.sum()))
+        if self.type == 'polygon':
+            total_area, moment = 0.0, np.zeros(2)
+            for ring, exterior in rings:
+                x, y = ring[:, 0], ring[:, 1]
+                x_next, y_next = np.roll(x, -1), np.roll(y, -1)
+                cross = x * y_next - x_next * y
+                area = cross.sum() / 2
+                if area == 0:
+                    continue
+                weight = abs(area) if exterior else -abs(area)
+                total_area += weight
+                moment += weight * np.array([((x + x_next) * cross).sum(), ((y + y_next) * cross).sum()]) / (6 * area)
+            if total_area != 0:
+                return Point(*(moment / total_area))
+        return Point(*vertices.mean(axis = 0))
+
+    @property
+    def centroid(self):
+        # like arcpy, the true centroid if it is on the feature, otherwise the label point. The label point of a polygon is the middle of the widest
+        # inside stretch of the horizontal line through the true centroid, and the label point of a line is its middle vertex.
+        true_centroid = self.trueCentroid
+        if self.type == 'polygon':
+            crossings = []
+            for ring, exterior in self._rings():
+                x, y = ring[:, 0], ring[:, 1]
+                x_next, y_next = np.roll(x, -1), np.roll(y, -1)
+                spans = (y > true_centroid.Y) != (y_next > true_centroid.Y)
+                x, y, x_next, y_next = x[spans], y[spans], x_next[spans], y_next[spans]
+                crossings.extend((x + (true_centroid.Y - y) * (x_next - x) / (y_next - y)).tolist())
+            crossings = sorted(crossings)
+            inside = [(start, end) for start, end in zip(crossings[0::2], crossings[1::2])]
+            if (len(inside) == 0) or any(start <= true_centroid.X <= end for start, end in inside):
+                return true_centroid
+            start, end = max(inside, key = lambda stretch: stretch[1] - stretch[0])
+            return Point((start + end) / 2, true_centroid.Y)
+        if self.type == 'polyline':
+            vertices = np.concatenate([ring for ring, exterior in self._rings()])
+            if not np.any(np.all(np.isclose(vertices, (true_centroid.X, true_centroid.Y)), axis = 1)):
+                return Point(*vertices[len(vertices) // 2])
+        return true_centroid
+
+    @property
+    def pointCount(self):
+        return sum(1 for part in self.parts for point in part if point is not None)
+
+def make_geometry(shape_type, coordinates):
+
+    # builds a Geometry from plain coordinates: (x, y) for a Point, a list of (x, y) for a Multipoint, a list of parts (lists of (x, y)) for a Polyline or Polygon
+    if shape_type == 'Point':
+        return Geometry(shape_type, [[Point(*coordinates)]])
+    if shape_type == 'Multipoint':
+        return Geometry(shape_type, [[Point(*xy) for xy in coordinates]])
+    return Geometry(shape_type, [[Point(*xy) for xy in part] for part in coordinates])
+
+### datasets
+
+_numpy_types = {'OID': '<i4', 'Integer': '<i4', 'SmallInteger': '<i2', 'Double': '<f8', 'Single': '<f4', 'FLOAT': '<f4', 'DOUBLE': '<f8', 'LONG': '<i4', 'SHORT': '<i2'}
+
+def _field_type_of(values):
+    dtype = np.asarray(values).dtype
+    if dtype.kind in 'iu':
+        return 'Integer'
+    if dtype.kind == 'f':
+        return 'Double'
+    return 'String'
+
+def create_dataset(path, shape_type = None, columns = None, shapes = None, add_layer = True):
+
+    # creates (or replaces) a feature class (shape_type 'Point', 'Polyline', 'Polygon' or 'Multipoint') or a table (shape_type None).
+    # columns is {field name: list of values} without OBJECTID, which is assigned 1..n. shapes is a list of Geometry, one per row.
+    columns = {} if columns is None else {name: list(values) for name, values in columns.items() if name != 'OBJECTID'}
+    num_rows = len(shapes) if shapes is not None else (len(next(iter(columns.values()))) if len(columns) > 0 else 0)
+    dataset = {
+        'name': _basename(path),
+        'shape_type': shape_type,
+        'fields': ['OBJECTID'] + (['Shape'] if shape_type is not None else []) + list(columns),
+        'field_types': {name: _field_type_of(values) for name, values in columns.items()},
+        'columns': dict({'OBJECTID': list(range(1, num_rows + 1))}, **columns),
+        'shapes': list(shapes) if shapes is not None else None
+    }
+    _datasets[_key(path)] = dataset
+    if write_through_folder is not None:
+        with open(os.path.join(write_through_folder, re.sub(r'[^A-Za-z0-9_]', '_', _key(path)) + '.pkl'), 'wb') as file:
+            pickle.dump(dataset, file)
+    if add_layer == True:
+        _map.layers.append(_Layer(dataset['name']))
+    return dataset
+
+def _dataset(path):
+    key = _key(path)
+    if key not in _datasets:
+        # layer names (as used by some tools in ArcGIS Pro) are resolved by name
+        matches = [dataset for dataset in _datasets.values() if dataset['name'].lower() == key]
+        if len(matches) == 0:
+            raise RuntimeError(f"ERROR 000732: Dataset {path} does not exist or is not supported")
+        return matches[0]
+    return _datasets[key]
+
+def _value(dataset, field, idx):
+    if field in ('OID@', 'OBJECTID'):
+        return dataset['columns']['OBJECTID'][idx]
+    shape = dataset['shapes'][idx] if dataset['shapes'] is not None else None
+    if field in ('SHAPE@', 'Shape'):
+        return shape
+    if field == 'SHAPE@XY':
+        centroid = shape.centroid
+        return (centroid.X, centroid.Y)
+    if field == 'SHAPE@TRUECENTROID':
+        true_centroid = shape.trueCentroid
+        return (true_centroid.X, true_centroid.Y)
+    if field == 'SHAPE@X':
+        return shape.centroid.X
+    if field == 'SHAPE@Y':
+        return shape.centroid.Y
+    return dataset['columns'][field][idx]
+
+### describe / list / exists / delete
+
+class SpatialReference:
+    def __init__(self, code = 4326):
+        self.factoryCode = code
+
+class _Description:
+    def __init__(self, dataset):
+        self.shapeType = dataset['shape_type']
+        self.name = dataset['name']
+        self.dataType = 'FeatureClass' if dataset['shape_type'] is not None else 'Table'
+
+class _Field:
+    def __init__(self, name, field_type):
+        self.name = name
+        self.baseName = name
+        self.type = field_type
+
+def Describe(path):
+    _count('Describe')
+    return _Description(_dataset(path))
+
+def ListFields(path):
+    _count('ListFields')
+    dataset = _dataset(path)
+    types_of = dict(dataset['field_types'], OBJECTID = 'OID', Shape = 'Geometry')
+    return [_Field(name, types_of.get(name, 'String')) for name in dataset['fields']]
+
+def Exists(path):
+    _count('Exists')
+    return _key(path) in _datasets
+
+def Delete_management(path, data_type = ''):
+    # like the real tool, takes one path, a list of paths, or paths separated by ;
+    _count('Delete_management')
+    for item in (path if isinstance(path, (list, tuple)) else str(path).split(';')):
+        _datasets.pop(_key(item), None)
+    return
+
+def GetCount_management(path):
+    _count('GetCount_management')
+    return [str(len(_dataset(path)['columns']['OBJECTID']))]
+
+env = types.SimpleNamespace(workspace = None, overwriteOutput = True)
+
+def ListFeatureClasses(wild_card = '*', feature_type = 'All'):
+    _count('ListFeatureClasses')
+    workspace = _key(env.workspace) + '/'
+    pattern = re.compile('^' + re.escape(wild_card.lower()).replace('\\*', '.*') + '$')
+    return [dataset['name'] for key, dataset in _datasets.items() if key.startswith(workspace) and dataset['shape_type'] is not None and pattern.match(dataset['name'].lower())]
+
+def ListTables(wild_card = '*'):
+    _count('ListTables')
+    workspace = _key(env.workspace) + '/'
+    pattern = re.compile('^' + re.escape(wild_card.lower()).replace('\\*', '.*') + '$')
+    return [dataset['name'] for key, dataset in _datasets.items() if key.startswith(workspace) and dataset['shape_type'] is None and pattern.match(dataset['name'].lower())]
+
+### cursors
+
+class _Row(list):
+    pass
+
+class SearchCursor:
+
+    def __init__(self, in_table, field_names, where_clause = None, spatial_reference = None):
+        _count('SearchCursor')
+        self.dataset = _dataset(in_table)
+        self.field_names = [field_names] if isinstance(field_names, str) else list(field_names)
+        self.indices = _select_indices(self.dataset, where_clause)
+
+    def __iter__(self):
+        for idx in self.indices:
+            yield tuple(_value(self.dataset, field, idx) for field in self.field_names)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class UpdateCursor(SearchCursor):
+
+    def __init__(self, in_table, field_names, where_clause = None, spatial_reference = None):
+        super().__init__(in_table, field_names, where_clause, spatial_reference)
+        _count('UpdateCursor')
+        self._current = None
+
+    def __iter__(self):
+        for idx in self.indices:
+            self._current = idx
+            yield _Row(_value(self.dataset, field, idx) for field in self.field_names)
+
+    def updateRow(self, row):
+        for field, value in zip(self.field_names, row):
+            if field in ('SHAPE@', 'Shape'):
+                self.dataset['shapes'][self._current] = value
+            elif field not in ('OID@', 'OBJECTID'):
+                self.dataset['columns'][field][self._current] = value
+        return
+
+class InsertCursor:
+
+    def __init__(self, in_table, field_names):
+        _count('InsertCursor')
+        self.dataset = _dataset(in_table)
+        self.field_names = [field_names] if isinstance(field_names, str) else list(field_names)
+
+    def insertRow(self, row):
+        columns = self.dataset['columns']
+        values = dict(zip(self.field_names, row))
+        columns['OBJECTID'].append(len(columns['OBJECTID']) + 1)
+        for name in columns:
+            if name != 'OBJECTID':
+                columns[name].append(values.get(name))
+        if self.dataset['shapes'] is not None:
+            shape = values.get('SHAPE@', values.get('SHAPE@XY'))
+            if isinstance(shape, tuple):
+                shape = make_geometry('Point', shape)
+            elif isinstance(shape, (Array, list)) and self.dataset['shape_type'] in ('Polyline', 'Polygon'):
+                shape = Geometry(self.dataset['shape_type'], [list(shape)])
+            self.dataset['shapes'].append(shape)
+        return len(columns['OBJECTID'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+def _select_indices(dataset, where_clause):
+
+    # supports the where clauses the rtkMachine builds: "field = value" terms joined by OR, and IN lists
+    num_rows = len(dataset['columns']['OBJECTID'])
+    if where_clause is None or where_clause.strip() == '':
+        return list(range(num_rows))
+    in_match = re.fullmatch(r"\s*(\w+)\s+IN\s*\((.*)\)\s*", where_clause, flags = re.IGNORECASE)
+    if in_match is not None:
+        terms = [(in_match.group(1), value.strip()) for value in in_match.group(2).split(',')]
+    else:
+        terms = [tuple(part.strip() for part in term.split('=')) for term in re.split(r'\s+OR\s+', where_clause, flags = re.IGNORECASE)]
+    wanted = {}
+    for field, value in terms:
+        wanted.setdefault(field, set()).add(value.strip("'") if value.startswith("'") else int(value))
+    selected = []
+    for idx in range(num_rows):
+        if any(_value(dataset, field, idx) in values for field, values in wanted.items()):
+            selected.append(idx)
+    return selected
+
+### numpy conversion
+
+def _to_numpy(dataset, field_names, indices = None):
+    indices = list(range(len(dataset['columns']['OBJECTID']))) if indices is None else indices
+    arrays = {}
+    for field in field_names:
+        values = [_value(dataset, field, idx) for idx in indices]
+        field_type = {'OBJECTID': 'Integer', 'OID@': 'Integer', 'SHAPE@X': 'Double', 'SHAPE@Y': 'Double'}.get(field, dataset['field_types'].get(field, 'String'))
+        if field in ('SHAPE@XY', 'SHAPE@TRUECENTROID'):
+            arrays[field] = np.asarray(values, dtype = '<f8').reshape(-1, 2)
+        elif field_type == 'Integer':
+            arrays[field] = np.asarray(values, dtype = '<i4')
+        elif field_type in ('Double', 'FLOAT', 'DOUBLE', 'Single'):
+            arrays[field] = np.asarray(values, dtype = '<f8')
+        else:
+            arrays[field] = np.asarray([str(value) for value in values], dtype = str) if len(values) > 0 else np.zeros(0, dtype = '<U1')
+    out = np.zeros(len(indices), dtype = [(field, arrays[field].dtype, arrays[field].shape[1:]) for field in field_names])
+    for field in field_names:
+        out[field] = arrays[field]
+    return out
+
+def _table_to_numpy(in_table, field_names, where_clause = None, spatial_reference = None, **kwargs):
+    dataset = _dataset(in_table)
+    field_names = dataset['fields'] if field_names == '*' else ([field_names] if isinstance(field_names, str) else list(field_names))
+    return _to_numpy(dataset, field_names, _select_indices(dataset, where_clause))
+
+def FeatureClassToNumPyArray(in_table, field_names, where_clause = None, spatial_reference = None, **kwargs):
+    _count('FeatureClassToNumPyArray')
+    return _table_to_numpy(in_table, field_names, where_clause, spatial_reference)
+
+def TableToNumPyArray(in_table, field_names, where_clause = None, **kwargs):
+    _count('TableToNumPyArray')
+    return _table_to_numpy(in_table, field_names, where_clause)
+
+def NumPyArrayToTable(in_array, out_table):
+    _count('NumPyArrayToTable')
+    create_dataset(out_table, columns = {name: in_array[name].tolist() for name in in_array.dtype.names}, add_layer = False)
+    return
+
+class Array(list):
+    def __init__(self, items = None):
+        super().__init__(items or [])
+
+    def add(self, item):
+        self.append(item)
+
+def PointGeometry(point, spatial_reference = None):
+    return Geometry('Point', [[point]])
+
+def Polyline(array, spatial_reference = None):
+    return Geometry('Polyline', [list(array)])
+
+da = types.SimpleNamespace(
+    SearchCursor = SearchCursor,
+    UpdateCursor = UpdateCursor,
+    InsertCursor = InsertCursor,
+    FeatureClassToNumPyArray = FeatureClassToNumPyArray,
+    TableToNumPyArray = TableToNumPyArray,
+    NumPyArrayToTable = NumPyArrayToTable
+)
+
+### geoprocessing tools
+
+def _copy(source, out_path, indices = None, add_layer = True):
+    indices = list(range(len(source['columns']['OBJECTID']))) if indices is None else indices
+    columns = {name: [values[idx] for idx in indices] for name, values in source['columns'].items() if name != 'OBJECTID'}
+    shapes = [source['shapes'][idx] for idx in indices] if source['shapes'] is not None else None
+    dataset = create_dataset(out_path, source['shape_type'], columns, shapes, add_layer = add_layer)
+    dataset['field_types'] = dict(source['field_types'])
+    return dataset
+
+def CopyFeatures(in_features, out_feature_class, config_keyword = '', spatial_grid_1 = None, spatial_grid_2 = None, spatial_grid_3 = None):
+    _count('CopyFeatures')
+    _copy(_dataset(in_features), out_feature_class)
+    return
+
+def Select_analysis(in_features, out_feature_class, where_clause = None):
+    _count('Select_analysis')
+    source = _dataset(in_features)
+    _copy(source, out_feature_class, _select_indices(source, where_clause))
+    return
+
+def FeatureToPoint(in_features, out_feature_class, point_location = 'CENTROID'):
+    _count('FeatureToPoint')
+    source = _dataset(in_features)
+    dataset = _copy(source, out_feature_class)
+    dataset['shape_type'] = 'Point'
+    dataset['shapes'] = [Geometry('Point', [[shape.trueCentroid]]) for shape in dataset['shapes']]
+    return
+
+def AddField(in_table, field_name, field_type, **kwargs):
+    _count('AddField')
+    dataset = _dataset(in_table)
+    dataset['fields'].append(field_name)
+    dataset['field_types'][field_name] = 'Double' if field_type in ('FLOAT', 'DOUBLE') else ('Integer' if field_type in ('LONG', 'SHORT') else 'String')
+    dataset['columns'][field_name] = [None] * len(dataset['columns']['OBJECTID'])
+    return
+
+def AddFields(in_table, field_description, **kwargs):
+    _count('AddFields')
+    dataset = _dataset(in_table)
+    for description in field_description:
+        field_name, field_type = description[0], description[1]
+        dataset['fields'].append(field_name)
+        dataset['field_types'][field_name] = 'Double' if field_type in ('FLOAT', 'DOUBLE') else ('Integer' if field_type in ('LONG', 'SHORT') else 'String')
+        dataset['columns'][field_name] = [None] * len(dataset['columns']['OBJECTID'])
+    return
+
+def CreateFeatureclass(out_path, out_name, geometry_type = 'POINT', template = None, spatial_reference = None, **kwargs):
+    _count('CreateFeatureclass')
+    shape_type = {'POINT': 'Point', 'POLYLINE': 'Polyline', 'POLYGON': 'Polygon', 'MULTIPOINT': 'Multipoint'}[geometry_type.upper()]
+    create_dataset(f"{out_path}/{out_name}", shape_type, shapes = [])
+    return
+
+def XYTableToPoint(in_table, out_feature_class, x_field, y_field, z_field = None, coordinate_system = None):
+    _count('XYTableToPoint')
+    source = _dataset(in_table)
+    shapes = [make_geometry('Point', (x, y)) for x, y in zip(source['columns'][x_field], source['columns'][y_field])]
+    dataset = create_dataset(out_feature_class, 'Point', {name: values for name, values in source['columns'].items()}, shapes)
+    dataset['field_types'] = dict(source['field_types'])
+    return
+
+def Merge(inputs, output, field_mappings = None, add_source = 'NO_SOURCE_INFO', field_match_mode = 'USE_FIRST_SCHEMA'):
+    _count('Merge')
+    sources = [_dataset(path) for path in (inputs.split(';') if isinstance(inputs, str) else inputs)]
+    names = [name for name in sources[0]['columns'] if name != 'OBJECTID']
+    columns = {name: sum((list(source['columns'].get(name, [None] * len(source['columns']['OBJECTID']))) for source in sources), []) for name in names}
+    shapes = sum((list(source['shapes']) for source in sources), [])
+    dataset = create_dataset(output, sources[0]['shape_type'], columns, shapes)
+    dataset['field_types'] = dict(sources[0]['field_types'])
+    return
+
+def PointsToLine(Input_Features, Output_Feature_Class, Line_Field = None, Sort_Field = None, Close_Line = 'NO_CLOSE', Line_Construction_Method = 'CONTINUOUS', Attribute_Source = 'NONE', Transfer_Fields = None):
+    _count('PointsToLine')
+    source = _dataset(Input_Features)
+    groups = {}
+    for idx, value in enumerate(source['columns'][Line_Field]):
+        groups.setdefault(value, []).append(source['shapes'][idx].centroid)
+    create_dataset(Output_Feature_Class, 'Polyline', {Line_Field: list(groups)}, [Geometry('Polyline', [points]) for points in groups.values()])
+    return
+
+def Compact(in_workspace):
+    _count('Compact')
+    return
+
+def GenerateNearTable(in_features, near_features, out_table, search_radius = None, location = 'NO_LOCATION', angle = 'NO_ANGLE', closest = 'ALL', closest_count = 0, method = 'PLANAR', distance_unit = None):
+
+    # brute force on a sphere, only as a stand-in for the geoprocessing path
+    _count('GenerateNearTable')
+    source = _dataset(in_features)
+    near = _dataset(near_features)
+    near_lon = np.radians([shape.centroid.X for shape in near['shapes']])
+    near_lat = np.radians([shape.centroid.Y for shape in near['shapes']])
+
+    rows = {name: [] for name in ['IN_FID', 'NEAR_FID', 'NEAR_DIST', 'FROM_X', 'FROM_Y', 'NEAR_X', 'NEAR_Y', 'NEAR_ANGLE', 'NEAR_RANK']}
+    for idx, shape in enumerate(source['shapes']):
+        lon, lat = np.radians(shape.centroid.X), np.radians(shape.centroid.Y)
+        hav = np.sin((near_lat - lat) / 2) ** 2 + np.cos(lat) * np.cos(near_lat) * np.sin((near_lon - lon) / 2) ** 2
+        distances = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(hav))
+        angles = np.degrees(np.arctan2(np.sin(near_lon - lon) * np.cos(near_lat), np.cos(lat) * np.sin(near_lat) - np.sin(lat) * np.cos(near_lat) * np.cos(near_lon - lon)))
+        order = np.argsort(distances)[:int(closest_count) if closest_count else len(distances)]
+        for rank, near_idx in enumerate(order):
+            rows['IN_FID'].append(source['columns']['OBJECTID'][idx])
+            rows['NEAR_FID'].append(near['columns']['OBJECTID'][near_idx])
+            rows['NEAR_DIST'].append(float(distances[near_idx]))
+            rows['FROM_X'].append(shape.centroid.X)
+            rows['FROM_Y'].append(shape.centroid.Y)
+            rows['NEAR_X'].append(float(np.degrees(near_lon[near_idx])))
+            rows['NEAR_Y'].append(float(np.degrees(near_lat[near_idx])))
+            rows['NEAR_ANGLE'].append(float(angles[near_idx]))
+            rows['NEAR_RANK'].append(rank + 1)
+    create_dataset(out_table, None, rows)
+    return
+
+management = types.SimpleNamespace(
+    CopyFeatures = CopyFeatures,
+    FeatureToPoint = FeatureToPoint,
+    AddField = AddField,
+    AddFields = AddFields,
+    CreateFeatureclass = CreateFeatureclass,
+    XYTableToPoint = XYTableToPoint,
+    Merge = Merge,
+    PointsToLine = PointsToLine,
+    Delete = Delete_management,
+    Compact = Compact,
+    GetCount = GetCount_management
+)
+analysis = types.SimpleNamespace(GenerateNearTable = GenerateNearTable, Select = Select_analysis)
+
+### mapping
+
+class _Layer:
+    def __init__(self, name):
+        self.name = name
+        self.longName = name
+
+class _Map:
+    def __init__(self):
+        self.layers = []
+
+    def listLayers(self, wildcard = None):
+        return list(self.layers)
+
+    def removeLayer(self, layer):
+        self.layers.remove(layer)
+        return
+
+_map = _Map()
+
+class ArcGISProject:
+    def __init__(self, path):
+        if path != 'CURRENT':
+            raise OSError(path)
+        self.activeMap = _map
+
+mp = types.SimpleNamespace(ArcGISProject = ArcGISProject)
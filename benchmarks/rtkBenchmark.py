@@ -0,0 +1,275 @@
+### Benchmark suite for the rtkMachine, run against synthetic station networks with the arcpy stand-in in benchmarks/fake_arcpy, so it runs without ArcGIS Pro.
+# Reports wall time (and optionally peak traced memory) per stage of rtkMachine.run, run_batch, and the original geoprocessing path (GenerateNearTable and a row-by-row output table),
+# for a range of network sizes, flight shapes, and num_close values.
+#
+# Example, from the repository folder:
+#     python benchmarks/rtkBenchmark.py --stations 1000 10000 100000 --num-close 1 5 25 100 500 --shapes point polyline polygon --legacy --memory
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# the stand-in is put in front of any real arcpy, because the synthetic data is created through it
+BENCHMARK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_FOLDER, 'fake_arcpy'))
+sys.path.insert(1, os.path.dirname(BENCHMARK_FOLDER))
+
+import arcpy
+import numpy as np
+import pandas as pd
+from rtkMachine_v1 import rtkMachine, rtkStationCatalog
+
+# extent of the synthetic networks and flights, roughly the GAGE western US network
+WEST, SOUTH, EAST, NORTH = -125.0, 31.0, -102.0, 49.0
+
+# status mix of the synthetic networks
+STATUS_VALUES = ['OK', 'Status Unavailable', 'Offline']
+STATUS_WEIGHTS = [0.75, 0.2, 0.05]
+
+### synthetic data
+
+def make_station_network(folder, num_stations, seed = 0):
+
+    # creates a synthetic rtkGDB.gdb folder with a realtime_points feature class of num_stations stations, with the same fields as the real one. Returns the path to the gdb.
+
+    rng = np.random.default_rng(seed)
+    path_to_gdb = os.path.join(folder, f"synthetic{num_stations}.gdb")
+    os.makedirs(path_to_gdb, exist_ok = True)
+    with open(os.path.join(path_to_gdb, 'gdb'), 'w') as file: # the catalog cache watches the files in the gdb folder
+        file.write(str(num_stations))
+
+    lon = rng.uniform(WEST, EAST, num_stations)
+    lat = rng.uniform(SOUTH, NORTH, num_stations)
+    columns = {
+        'pnum': [f"S{idx:06d}" for idx in range(num_stations)],
+        'stntype': ['GPS/GNSS'] * num_stations,
+        'stnstatus': ['Active'] * num_stations,
+        'opstatus': ['Operational'] * num_stations,
+        'sitecity': ['Synthetic'] * num_stations,
+        'sitestate': ['XX'] * num_stations,
+        'region': ['West'] * num_stations,
+        'elev': rng.uniform(0, 3000, num_stations).tolist(),
+        'project': ['NOTA'] * num_stations,
+        'networks': ['NOTA'] * num_stations,
+        'multi_types': ['GPS'] * num_stations,
+        'is_realtime': ['true'] * num_stations,
+        'mean_latency_last_hour': rng.uniform(0, 2, num_stations).tolist(),
+        'mean_latency_last_day': rng.uniform(0, 2, num_stations).tolist(),
+        'data_complete_last_day': rng.uniform(90, 100, num_stations).tolist(),
+        'data_complete_last_hour': rng.uniform(90, 100, num_stations).tolist(),
+        'status': rng.choice(STATUS_VALUES, size = num_stations, p = STATUS_WEIGHTS).tolist()
+    }
+    shapes = [arcpy.make_geometry('Point', xy) for xy in zip(lon, lat)]
+    arcpy.create_dataset(rf"{path_to_gdb}\realtime_points", 'Point', columns, shapes, add_layer = False)
+    return path_to_gdb
+
+def make_flight(folder, shape_type, num_features = 1, num_vertices = 200, seed = 1):
+
+    # creates a flight feature class of num_features Points, Polylines (tracks of num_vertices vertices, about 100 km long) or Polygons (survey areas of num_vertices vertices, about 50 km across).
+
+    rng = np.random.default_rng(seed)
+    shapes = []
+    for _ in range(num_features):
+        center_lon = rng.uniform(WEST + 1, EAST - 1)
+        center_lat = rng.uniform(SOUTH + 1, NORTH - 1)
+        if shape_type == 'Point':
+            shapes.append(arcpy.make_geometry('Point', (center_lon, center_lat)))
+        elif shape_type == 'Polyline':
+            steps = np.linspace(-0.5, 0.5, num_vertices)
+            shapes.append(arcpy.make_geometry('Polyline', [list(zip(center_lon + steps, center_lat + 0.3 * steps))]))
+        else:
+            angles = np.linspace(0, 2 * np.pi, num_vertices)
+            ring = list(zip(center_lon + 0.3 * np.cos(angles), center_lat + 0.2 * np.sin(angles)))
+            shapes.append(arcpy.make_geometry('Polygon', [ring + [ring[0]]]))
+
+    path = rf"{folder}\flights.gdb\flight_{shape_type.lower()}_{num_features}_{seed}"
+    arcpy.create_dataset(path, shape_type, {'name': [f"flight{idx}" for idx in range(num_features)]}, shapes, add_layer = False)
+    return path
+
+### timing
+
+class StageTimer:
+
+    # times named stages, with the peak traced memory of each one when memory = True
+
+    def __init__(self, memory = False):
+        self.memory = memory
+        self.records = []
+
+    def run(self, stage, function, *args, **kwargs):
+        if self.memory == True:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peak_bytes = tracemalloc.get_traced_memory()[1] if self.memory == True else np.nan
+        if self.memory == True:
+            tracemalloc.stop()
+        self.records.append({'stage': stage, 'seconds': seconds, 'peak_memory_mb': peak_bytes / 2 ** 20})
+        return result
+
+    def run_machine(self, machine, method):
+
+        # calls machine.<method>() and records every stage of its .run_report, so the stages are the ones the machine actually ran.
+        # With memory = True, the whole call is traced, and the peak is read and reset after each stage through the machine's callbacks.
+        # The memory still held from earlier stages is taken off, so the peaks compare with the ones of timer.run.
+        peaks = []
+        held_bytes = [0]
+        def record_peak(record):
+            peaks.append(tracemalloc.get_traced_memory()[1] - held_bytes[0])
+            tracemalloc.reset_peak()
+            held_bytes[0] = tracemalloc.get_traced_memory()[0]
+
+        if self.memory == True:
+            machine.callbacks = [record_peak]
+            tracemalloc.start()
+        try:
+            getattr(machine, method)()
+        finally:
+            if self.memory == True:
+                tracemalloc.stop()
+
+        for idx, row in enumerate(machine.run_report.itertuples()):
+            peak_bytes = peaks[idx] if self.memory == True else np.nan
+            self.records.append({'stage': row.stage, 'seconds': row.seconds, 'peak_memory_mb': peak_bytes / 2 ** 20})
+        return
+
+def benchmark_run(path_to_gdb, path_to_flight, num_close, timer):
+
+    machine = rtkMachine(path_to_gdb = path_to_gdb, path_to_flight_featureclass = path_to_flight, num_close = num_close, print_output = False)
+    timer.run_machine(machine, 'run')
+    return machine
+
+def benchmark_run_batch(path_to_gdb, path_to_flight, num_close, timer):
+
+    machine = rtkMachine(path_to_gdb = path_to_gdb, path_to_flight_featureclass = path_to_flight, num_close = num_close, print_output = False)
+    timer.run('run_batch', machine.run_batch)
+    return machine
+
+def benchmark_legacy(path_to_gdb, path_to_flight, num_close, timer):
+
+    # the original geoprocessing path, through the same arcpy calls: copy + cursor passes for the status, Select for the OK stations, FeatureToPoint,
+    # GenerateNearTable written to the gdb and read back, and the row-by-row output table. Kept here as the baseline to compare with.
+
+    run_id = f"legacy{num_close}"
+    working_copy = rf"{path_to_gdb}\realtime_points_workingcopy{run_id}"
+    usable = rf"{path_to_gdb}\realtime_points_status_ok{run_id}"
+    centerpoint = rf"{path_to_gdb}\flight_centerpoint{run_id}"
+    near_table_path = rf"{path_to_gdb}\flight_centerpoint_near_realtime_ok_table{run_id}"
+
+    def modify():
+        arcpy.management.CopyFeatures(in_features = rf"{path_to_gdb}\realtime_points", out_feature_class = working_copy)
+        with arcpy.da.UpdateCursor(working_copy, ['pnum']) as cursor:
+            list_of_names = [row[0] for row in cursor]
+        with arcpy.da.UpdateCursor(working_copy, ['status']) as cursor:
+            for row in cursor:
+                cursor.updateRow(row)
+        return list_of_names
+
+    def near():
+        arcpy.analysis.GenerateNearTable(in_features = centerpoint, near_features = usable, out_table = near_table_path, location = "LOCATION", angle = "ANGLE", closest = "ALL", closest_count = num_close, method = "GEODESIC")
+
+    def output_stats():
+        near_table_pd = pd.DataFrame(arcpy.da.TableToNumPyArray(near_table_path, ["OBJECTID", "NEAR_FID", "NEAR_RANK", "NEAR_DIST", "NEAR_ANGLE"]))
+        field_names = [field.baseName for field in arcpy.ListFields(usable) if field.baseName != 'Shape']
+        realtime_pd = pd.DataFrame(arcpy.da.FeatureClassToNumPyArray(usable, field_names))
+        init_pd = pd.DataFrame()
+        for i in range(len(near_table_pd)):
+            nearpoint = near_table_pd.iloc[i]
+            nearpoint_info = realtime_pd[realtime_pd['OBJECTID'] == nearpoint['NEAR_FID']].copy()
+            nearpoint_info['horizontal_error_est'] = 8 + nearpoint['NEAR_DIST'] / 1000
+            nearpoint_info['vertical_error_est'] = 15 + nearpoint['NEAR_DIST'] / 1000
+            nearpoint_info['distance_meters'] = nearpoint['NEAR_DIST']
+            init_pd = pd.concat([init_pd, nearpoint_info])
+        return init_pd
+
+    def cleanup():
+        for path in (working_copy, usable, centerpoint, near_table_path):
+            if arcpy.Exists(path):
+                arcpy.Delete_management(path)
+
+    timer.run('legacy_modify_realtime_points', modify)
+    timer.run('legacy_get_usable_realtime_points', arcpy.Select_analysis, working_copy, usable, where_clause = "status = 'OK'")
+    timer.run('legacy_get_center_point', arcpy.management.FeatureToPoint, in_features = path_to_flight, out_feature_class = centerpoint, point_location = "CENTROID")
+    timer.run('legacy_generate_near_table', near)
+    timer.run('legacy_get_output_stats', output_stats)
+    timer.run('legacy_cleanup', cleanup)
+    return
+
+### suite
+
+def run_suite(station_counts, num_close_values, shape_types, batch_flights, legacy, repeat, memory):
+
+    folder = tempfile.mkdtemp(prefix = 'rtk_benchmark_')
+    records = []
+
+    for num_stations in station_counts:
+        arcpy.reset()
+        rtkStationCatalog.clear_cache()
+        path_to_gdb = make_station_network(folder, num_stations)
+
+        for shape_type in shape_types:
+            path_to_flight = make_flight(folder, shape_type)
+            path_to_batch = make_flight(folder, shape_type, num_features = batch_flights) if batch_flights > 0 else None
+
+            for num_close in num_close_values:
+                modes = [('run', benchmark_run, path_to_flight)]
+                if path_to_batch is not None:
+                    modes.append(('run_batch', benchmark_run_batch, path_to_batch))
+                if legacy == True:
+                    modes.append(('legacy', benchmark_legacy, path_to_flight))
+
+                for mode, function, path in modes:
+                    for repetition in range(repeat):
+                        arcpy.call_counts.clear()
+                        timer = StageTimer(memory = memory)
+                        function(path_to_gdb, path, num_close, timer)
+                        for record in timer.records:
+                            records.append(dict(record, mode = mode, num_stations = num_stations, shape_type = shape_type, num_close = num_close, repetition = repetition,
+                                                geoprocessing_calls = sum(arcpy.call_counts.values())))
+
+    return pd.DataFrame(records)
+
+def summarize(records):
+
+    # median over repetitions of each stage, plus the total of every run
+    group_columns = ['mode', 'num_stations', 'shape_type', 'num_close', 'stage']
+    stages = records.groupby(group_columns, sort = False)[['seconds', 'peak_memory_mb']].median().reset_index()
+    totals = records.groupby(group_columns[:-1] + ['repetition'], sort = False).agg(seconds = ('seconds', 'sum'), peak_memory_mb = ('peak_memory_mb', 'max'), geoprocessing_calls = ('geoprocessing_calls', 'max'))
+    totals = totals.groupby(group_columns[:-1], sort = False).median().reset_index()
+    return stages, totals
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = "Benchmark the rtkMachine on synthetic station networks, using the arcpy stand-in.")
+    parser.add_argument('--stations', type = int, nargs = '+', default = [1000, 10000], help = "network sizes, for example 1000 10000 100000")
+    parser.add_argument('--num-close', type = int, nargs = '+', default = [1, 5, 25, 100, 500], help = "num_close values")
+    parser.add_argument('--shapes', nargs = '+', default = ['Point', 'Polyline', 'Polygon'], type = lambda value: value.capitalize(), help = "flight shapes: point polyline polygon")
+    parser.add_argument('--batch-flights', type = int, default = 100, help = "features in the run_batch flight feature class (0 to skip run_batch)")
+    parser.add_argument('--legacy', action = 'store_true', help = "also time the original geoprocessing path")
+    parser.add_argument('--repeat', type = int, default = 3, help = "repetitions of every run; the median is reported")
+    parser.add_argument('--memory', action = 'store_true', help = "record peak traced memory per stage (slower)")
+    parser.add_argument('--write-through', action = 'store_true', help = "pickle every dataset the stand-in tools create to disk, to give them a write cost")
+    parser.add_argument('--csv', help = "write every stage record to this CSV file")
+    args = parser.parse_args(argv)
+
+    if args.write_through == True:
+        arcpy.write_through_folder = tempfile.mkdtemp(prefix = 'rtk_benchmark_io_')
+
+    records = run_suite(args.stations, args.num_close, args.shapes, args.batch_flights, args.legacy, args.repeat, args.memory)
+    stages, totals = summarize(records)
+
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(stages.to_string(index = False))
+        print('\n')
+        print(totals.to_string(index = False))
+
+    if args.csv is not None:
+        records.to_csv(args.csv, index = False)
+    return records
+
+if __name__ == '__main__':
+    main()
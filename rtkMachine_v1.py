@@ -1,7 +1,1805 @@
 ### imports
+import hashlib
+import json
+import os
+import re
+import shutil
+import struct
+import sys
+import time
+import traceback
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
 
+# cProfile, pstats, pickle, uuid and concurrent.futures are only needed for profiling, result cache files, run_ids and run_parallel, which most runs never use.
+# They are imported where they are used, like arcpy below, so importing this file stays fast.
+
+# arcpy is already defined when this file is loaded with 'Load Code' in the ArcGIS Pro python window. When the file is imported as a module instead
+# (for example by a standalone script, or by the worker processes of rtkMachine.run_parallel), arcpy is only imported the first time it is used.
+# Runs that never touch a geodatabase or a map (a station snapshot plus flight_geometry, without drawing) then work without ArcGIS Pro, and importing this file stays fast.
+class _LazyArcpy:
+
+    def __getattr__(self, name):
+        global arcpy
+        try:
+            import arcpy as arcpy_module
+        except ImportError:
+            raise Exception("arcpy is needed for this step, but is not installed. Without ArcGIS Pro, use a station snapshot (see rtkStationCatalog.to_snapshot) and flight_geometry, with draw_lines, display_nearby_points and use_map set to False.")
+        arcpy = arcpy_module
+        return getattr(arcpy_module, name)
+
+try:
+    arcpy
+except NameError:
+    arcpy = _LazyArcpy()
+
+### geodesic nearest-station engine
+
+# WGS84 ellipsoid, the spatial reference of realtime_points. Distances and angles are computed on this ellipsoid, as GenerateNearTable does with method="GEODESIC".
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+# the smallest radius of curvature of the ellipsoid (north-south, at the equator). A geodesic distance is never shorter than this radius times the angle between
+# the two points on the unit sphere of _to_unit_vectors, so the sphere gives a safe bound on which stations can be nearer than a known distance.
+WGS84_MIN_RADIUS = WGS84_B ** 2 / WGS84_A
+
+def _geodesic_inverse(lon1, lat1, lon2, lat2, max_iterations = 20, tolerance = 1e-12):
+
+    # Vectorized Vincenty inverse formula. Inputs are degrees and broadcast against each other.
+    # Returns the geodesic distance in meters and the azimuth from point 1 to point 2 in degrees (0 = North, 90 = East, -90 = West, +-180 = South), the same convention as NEAR_ANGLE.
+
+    lon1, lat1, lon2, lat2 = np.broadcast_arrays(*[np.asarray(value, dtype = np.float64) for value in (lon1, lat1, lon2, lat2)])
+
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat2)))
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    for _ in range(max_iterations):
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.sqrt((cosU2 * sin_lam) ** 2 + (cosU1 * sinU2 - sinU1 * cosU2 * cos_lam) ** 2)
+        cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+
+        # coincident points have sin_sigma == 0, and points on the equator have cos2_alpha == 0. Both are guarded so they come out as zeros rather than NaN.
+        coincident = sin_sigma == 0
+        sin_alpha = np.where(coincident, 0.0, cosU1 * cosU2 * sin_lam / np.where(coincident, 1.0, sin_sigma))
+        cos2_alpha = 1 - sin_alpha ** 2
+        on_equator = cos2_alpha == 0
+        cos_2sigma_m = np.where(on_equator, 0.0, cos_sigma - 2 * sinU1 * sinU2 / np.where(on_equator, 1.0, cos2_alpha))
+
+        C = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+        lam_previous = lam
+        lam = L + (1 - C) * WGS84_F * sin_alpha * (sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+        if lam.size == 0 or np.max(np.abs(lam - lam_previous)) < tolerance:
+            break
+
+    u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    distance = WGS84_B * A * (sigma - delta_sigma)
+
+    azimuth = np.degrees(np.arctan2(cosU2 * np.sin(lam), cosU1 * sinU2 - sinU1 * cosU2 * np.cos(lam)))
+
+    return distance, azimuth
+
+def _to_unit_vectors(lon, lat):
+
+    # converts degrees to (n, 3) unit-sphere vectors. The dot product of two of these vectors gets larger as the points get closer, so it can be used to rank stations.
+
+    lon = np.radians(np.asarray(lon, dtype = np.float64))
+    lat = np.radians(np.asarray(lat, dtype = np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+class rtkStationIndex:
+
+    # In-process replacement for arcpy.analysis.GenerateNearTable. The station coordinates are stored once as unit-sphere vectors, so a query is a matrix product plus np.argpartition,
+    # and the few candidates are then re-ranked by exact geodesic distance. No table is written to or read from the geodatabase.
+    # The candidates are only a first guess: every station the sphere can't rule out (see WGS84_MIN_RADIUS) is ranked too, so the answers are exact even when many stations are nearly tied.
+
+    candidate_margin = 16 # extra candidates ranked by exact distance at first. Queries with more stations nearly tied than this are ranked again over all of them.
+    chunk_size = 4_000_000 # maximum number of query x station dot products held in memory at once
+
+    def __init__(self, lon, lat, ids = None, active = None) -> None:
+
+        self.lon = np.ascontiguousarray(lon, dtype = np.float64)
+        self.lat = np.ascontiguousarray(lat, dtype = np.float64)
+        if self.lon.shape != self.lat.shape or self.lon.ndim != 1:
+            raise Exception("station lon and lat need to be one-dimensional arrays of the same length")
+
+        # ids are what gets reported as NEAR_FID, for example the OBJECTID of each station. Defaults to the position of the station.
+        self.ids = np.arange(len(self.lon)) if ids is None else np.asarray(ids)
+        self.unit_vectors = _to_unit_vectors(self.lon, self.lat)
+
+        # boolean mask of the stations that can be returned by a query, for example status == 'OK'. Inactive stations stay in the index, so the mask can be changed without rebuilding it.
+        self.active = np.ones(len(self.lon), dtype = bool) if active is None else np.array(active, dtype = bool)
+        if self.active.shape != self.lon.shape:
+            raise Exception("active needs to be a boolean mask with one value per station")
+
+        return
+
+    def __len__(self):
+        return len(self.lon)
+
+    def set_active(self, positions, active = True):
+
+        # turns the stations at positions on or off without rebuilding the index.
+        self.active[np.asarray(positions, dtype = np.int64)] = active
+        return
+
+    def query(self, lon, lat, k = 1):
+
+        # returns (positions, distances, angles), each shaped (number of query points, k), with the nearest station first.
+        # positions index into the station arrays of this index; distances are geodesic meters; angles follow the NEAR_ANGLE convention.
+
+        lon = np.atleast_1d(np.asarray(lon, dtype = np.float64))
+        lat = np.atleast_1d(np.asarray(lat, dtype = np.float64))
+        inactive_positions = np.flatnonzero(~self.active)
+        num_active = len(self) - len(inactive_positions)
+        k = min(int(k), num_active)
+        num_candidates = min(k + rtkStationIndex.candidate_margin, num_active)
+
+        positions = np.empty((len(lon), k), dtype = np.int64)
+        distances = np.empty((len(lon), k), dtype = np.float64)
+        angles = np.empty((len(lon), k), dtype = np.float64)
+        if k == 0:
+            return positions, distances, angles
+
+        query_vectors = _to_unit_vectors(lon, lat)
+        rows_per_chunk = max(1, rtkStationIndex.chunk_size // len(self))
+
+        for start in range(0, len(lon), rows_per_chunk):
+            stop = min(start + rows_per_chunk, len(lon))
+
+            # largest dot products are the closest stations on the sphere. Unit vectors have dot products of at least -1, so -2 ranks inactive stations last.
+            dots = query_vectors[start:stop] @ self.unit_vectors.T
+            dots[:, inactive_positions] = -2
+            if num_candidates < len(self):
+                candidates = np.argpartition(-dots, num_candidates - 1, axis = 1)[:, :num_candidates]
+            else:
+                candidates = np.broadcast_to(np.arange(len(self)), dots.shape)
+
+            # exact ranking of the candidates on the ellipsoid
+            candidate_distances, candidate_angles = _geodesic_inverse(lon[start:stop, None], lat[start:stop, None], self.lon[candidates], self.lat[candidates])
+            order = np.argsort(candidate_distances, axis = 1, kind = 'stable')[:, :k]
+
+            positions[start:stop] = np.take_along_axis(candidates, order, axis = 1)
+            distances[start:stop] = np.take_along_axis(candidate_distances, order, axis = 1)
+            angles[start:stop] = np.take_along_axis(candidate_angles, order, axis = 1)
+
+            # a station can only be nearer than the k-th distance found if its angle on the sphere is at most that distance / WGS84_MIN_RADIUS (plus about half a meter for rounding).
+            # Query points with more stations within that angle than there were candidates are ranked again over all of those stations.
+            if num_candidates < num_active:
+                max_angles = np.minimum(distances[start:stop, -1] / WGS84_MIN_RADIUS + 1e-7, np.pi)
+                within = dots >= np.cos(max_angles)[:, None]
+                for row in np.flatnonzero(within.sum(axis = 1) > num_candidates):
+                    row_candidates = np.flatnonzero(within[row])
+                    row_distances, row_angles = _geodesic_inverse(lon[start + row], lat[start + row], self.lon[row_candidates], self.lat[row_candidates])
+                    row_order = np.argsort(row_distances, kind = 'stable')[:k]
+                    positions[start + row] = row_candidates[row_order]
+                    distances[start + row] = row_distances[row_order]
+                    angles[start + row] = row_angles[row_order]
+
+        return positions, distances, angles
+
+    def near_table(self, lon, lat, k = 1, in_fids = None):
+
+        # builds the same columns that GenerateNearTable writes with location="LOCATION", angle="ANGLE" and closest="ALL", as a pandas DataFrame.
+        # in_fids are reported as IN_FID for each query point, and default to 1..n like the OBJECTIDs of the input features.
+
+        lon = np.atleast_1d(np.asarray(lon, dtype = np.float64))
+        lat = np.atleast_1d(np.asarray(lat, dtype = np.float64))
+        in_fids = np.arange(1, len(lon) + 1) if in_fids is None else np.asarray(in_fids)
+
+        positions, distances, angles = self.query(lon, lat, k)
+        num_rows, k = positions.shape
+        flat_positions = positions.ravel()
+
+        near_table = pd.DataFrame({
+            'OBJECTID': np.arange(1, num_rows * k + 1),
+            'IN_FID': np.repeat(in_fids, k),
+            'NEAR_FID': self.ids[flat_positions],
+            'NEAR_DIST': distances.ravel(),
+            'FROM_X': np.repeat(lon, k),
+            'FROM_Y': np.repeat(lat, k),
+            'NEAR_X': self.lon[flat_positions],
+            'NEAR_Y': self.lat[flat_positions],
+            'NEAR_ANGLE': angles.ravel(),
+            'NEAR_RANK': np.tile(np.arange(1, k + 1), num_rows)
+        })
+        return near_table
+
+### session-wide station catalog
+
+def _workspace_of(path):
+
+    # the workspace (for example the .gdb folder) that holds a feature class path. Paths may use either slash.
+    separator_idx = max(path.rfind('\\'), path.rfind('/'))
+    return path[:separator_idx] if separator_idx > 0 else path
+
+def _gdb_table_files(path_to_gdb, table_name):
+
+    # the files of one table or feature class of a file gdb, or None if they can't be found. Every object of a file gdb is stored as a group of files named after its
+    # number in the system catalog (a00000001.gdbtable), for example a0000000b.gdbtable, a0000000b.gdbtablx and a0000000b.spx for the 11th object.
+    # The catalog rows are found through the offsets in a00000001.gdbtablx: a 16 byte header (version, number of 1024-row blocks, number of rows, bytes per offset),
+    # then one offset per object number (0 for deleted rows). Each row is its size in 4 bytes, then the name (a varuint length and UTF-8 text), then the file format.
+
+    try:
+        with open(os.path.join(path_to_gdb, 'a00000001.gdbtablx'), 'rb') as file:
+            offsets = file.read()
+        with open(os.path.join(path_to_gdb, 'a00000001.gdbtable'), 'rb') as file:
+            catalog = file.read()
+        _, num_blocks, _, offset_size = struct.unpack('<4i', offsets[:16])
+
+        for object_number in range(1, num_blocks * 1024 + 1):
+            start = 16 + (object_number - 1) * offset_size
+            row_offset = int.from_bytes(offsets[start:start + offset_size], 'little')
+            if row_offset == 0:
+                continue
+            position = row_offset + 4
+            name_length, shift = 0, 0
+            while True:
+                byte = catalog[position]
+                position += 1
+                name_length |= (byte & 0x7f) << shift
+                shift += 7
+                if byte < 0x80:
+                    break
+            if catalog[position:position + name_length].decode('utf-8').lower() == table_name.lower():
+                prefix = f"a{object_number:08x}."
+                return sorted(os.path.join(path_to_gdb, name) for name in os.listdir(path_to_gdb) if name.lower().startswith(prefix))
+    except (OSError, IndexError, ValueError, struct.error):
+        return None
+    return None
+
+def _source_signature(path, checksum = False):
+
+    # a value that changes whenever the station source changes on disk: the (name, size, modification time) of the files of the source.
+    # For a snapshot folder these are its column files. For a feature class in a file gdb, these are only the files of that feature class (see _gdb_table_files),
+    # so writing outputs to the same gdb does not change the signature. If its files can't be found, every file of the gdb is used instead.
+    # With checksum = True the file contents are hashed as well, for file systems where modification times are unreliable.
+
+    if os.path.isdir(path):
+        file_paths = sorted(os.path.join(path, name) for name in os.listdir(path))
+    elif os.path.exists(path):
+        file_paths = [path]
+    else:
+        # the gdb folder, also for a feature class inside a feature dataset (names are unique within a gdb, so the feature class name alone finds its files)
+        gdb_end = path.lower().rfind('.gdb')
+        workspace = path[:gdb_end + 4] if gdb_end >= 0 else _workspace_of(path)
+        table_name = path[max(path.rfind('\\'), path.rfind('/')) + 1:]
+        file_paths = _gdb_table_files(workspace, table_name) if os.path.isdir(workspace) else None
+        if file_paths is None:
+            file_paths = sorted(os.path.join(workspace, name) for name in os.listdir(workspace)) if os.path.isdir(workspace) else [workspace]
+
+    signature = []
+    for file_path in file_paths:
+        file_stat = os.stat(file_path)
+        signature.append((os.path.basename(file_path), file_stat.st_size, file_stat.st_mtime_ns))
+
+    if checksum == True:
+        digest = hashlib.sha1()
+        for file_path in file_paths:
+            if os.path.isfile(file_path):
+                with open(file_path, 'rb') as file:
+                    digest.update(file.read())
+        signature.append(digest.hexdigest())
+
+    return tuple(signature)
+
+# station snapshot folders written by rtkStationCatalog.to_snapshot. The version goes up whenever the layout changes.
+SNAPSHOT_FORMAT = 'rtk_station_snapshot'
+SNAPSHOT_FORMAT_VERSION = 1
+
+class rtkStationCatalog:
+
+    # The stations of realtime_points (pnum, status, coordinates and the other attribute columns) stored as one compact numpy array per column.
+    # Catalogs are cached per source path for the whole Python session, so every rtkMachine made in one ArcGIS Pro session (or one long-lived worker) shares them.
+    # A cached catalog is reused until its source changes on disk (see _source_signature). Catalogs are shared, so they should be treated as read-only.
+
+    _cache = {} # source path -> catalog
+    hits = 0 # number of times .load was answered from the cache
+    misses = 0 # number of times .load had to read the source
+
+    def __init__(self, columns, lon, lat, source = None, signature = None) -> None:
+
+        self.columns = {name: np.ascontiguousarray(values) for name, values in columns.items()}
+        self.field_names = list(self.columns)
+        self.lon = np.ascontiguousarray(lon, dtype = np.float64)
+        self.lat = np.ascontiguousarray(lat, dtype = np.float64)
+        self.source = source
+        self.signature = signature
+        return
+
+    def __len__(self):
+        return len(self.lon)
+
+    def to_frame(self):
+
+        # a new pandas DataFrame of the attribute columns (no coordinates), which can be modified without changing the catalog
+        return pd.DataFrame({name: values.copy() for name, values in self.columns.items()})
+
+    def station_index(self, status = None):
+
+        # builds an rtkStationIndex over all stations of the catalog, with the stations whose status is 'OK' active.
+        # status defaults to the catalog's own status column, and can be given as an overridden copy of it.
+
+        status = self.columns['status'] if status is None else np.asarray(status)
+        return rtkStationIndex(lon = self.lon, lat = self.lat, ids = self.columns['OBJECTID'], active = status == 'OK')
+
+    def to_snapshot(self, path_to_snapshot):
+
+        # writes the catalog to a snapshot folder: one .npy file per column plus schema.json, a header with the format version, column names, dtypes and row count.
+        # Text columns are stored as fixed-width unicode, so every column can be memory-mapped by from_snapshot. The folder is written next to its final path first, then moved into place.
+
+        temporary_path = f"{path_to_snapshot}.writing"
+        if os.path.exists(temporary_path):
+            shutil.rmtree(temporary_path)
+        os.makedirs(temporary_path)
+
+        schema_columns = []
+        for name, values in list(self.columns.items()) + [('SHAPE@X', self.lon), ('SHAPE@Y', self.lat)]:
+            if values.dtype == object:
+                values = values.astype(str)
+            file_name = f"column{len(schema_columns)}.npy"
+            np.save(os.path.join(temporary_path, file_name), values, allow_pickle = False)
+            schema_columns.append({'name': name, 'dtype': values.dtype.str, 'file': file_name})
+
+        schema = {
+            'format': SNAPSHOT_FORMAT,
+            'version': SNAPSHOT_FORMAT_VERSION,
+            'num_rows': len(self),
+            'source': self.source,
+            'columns': schema_columns
+        }
+        with open(os.path.join(temporary_path, 'schema.json'), 'w') as file:
+            json.dump(schema, file, indent = 2)
+
+        if os.path.exists(path_to_snapshot):
+            shutil.rmtree(path_to_snapshot)
+        os.replace(temporary_path, path_to_snapshot)
+        return
+
+    @classmethod
+    def from_snapshot(cls, path_to_snapshot, mmap = True):
+
+        # reads a snapshot folder written by to_snapshot, without arcpy or the geodatabase. With mmap = True every column is memory-mapped, so nothing is copied into memory until it is used.
+
+        with open(os.path.join(path_to_snapshot, 'schema.json')) as file:
+            schema = json.load(file)
+        if schema.get('format') != SNAPSHOT_FORMAT:
+            raise Exception(f"{path_to_snapshot} is not an rtk station snapshot")
+        if schema.get('version') != SNAPSHOT_FORMAT_VERSION:
+            raise Exception(f"station snapshot {path_to_snapshot} has format version {schema.get('version')}, but this version of the rtkMachine reads version {SNAPSHOT_FORMAT_VERSION}. Export the snapshot again.")
+
+        columns = {}
+        for column in schema['columns']:
+            values = np.load(os.path.join(path_to_snapshot, column['file']), mmap_mode = 'r' if mmap == True else None, allow_pickle = False)
+            if values.dtype.str != column['dtype'] or len(values) != schema['num_rows']:
+                raise Exception(f"column {column['name']} of station snapshot {path_to_snapshot} does not match its schema.json")
+            columns[column['name']] = values
+
+        lon = columns.pop('SHAPE@X')
+        lat = columns.pop('SHAPE@Y')
+        return cls(columns = columns, lon = lon, lat = lat, source = path_to_snapshot)
+
+    @classmethod
+    def load(cls, path_to_realtime, checksum = False):
+
+        # returns the catalog of the realtime points at path_to_realtime, from the cache if the source has not changed since it was read.
+        # path_to_realtime can also be a snapshot folder written by to_snapshot, which is read without arcpy.
+
+        signature = _source_signature(path_to_realtime, checksum = checksum)
+        cached = cls._cache.get(path_to_realtime)
+        if cached is not None and cached.signature == signature:
+            cls.hits += 1
+            return cached
+
+        cls.misses += 1
+        if os.path.isfile(os.path.join(path_to_realtime, 'schema.json')):
+            catalog = cls.from_snapshot(path_to_realtime)
+        else:
+            catalog = cls._read_feature_class(path_to_realtime)
+        catalog.signature = signature
+        cls._cache[path_to_realtime] = catalog
+        return catalog
+
+    @classmethod
+    def _read_feature_class(cls, path_to_realtime):
+
+        # reads every attribute field except Shape, plus the WGS84 coordinates, with one FeatureClassToNumPyArray call
+
+        realtimefields = arcpy.ListFields(path_to_realtime)
+        field_names = [field.baseName for field in realtimefields if field.baseName != 'Shape']
+
+        wgs84 = arcpy.SpatialReference(4326)
+        realtime_np = arcpy.da.FeatureClassToNumPyArray(in_table = path_to_realtime, field_names = field_names + ["SHAPE@X", "SHAPE@Y"], spatial_reference = wgs84)
+
+        columns = {name: realtime_np[name] for name in field_names}
+        return cls(columns = columns, lon = realtime_np["SHAPE@X"], lat = realtime_np["SHAPE@Y"], source = path_to_realtime)
+
+    @classmethod
+    def cache_info(cls):
+        return {'hits': cls.hits, 'misses': cls.misses, 'cached_sources': len(cls._cache)}
+
+    @classmethod
+    def clear_cache(cls):
+        cls._cache.clear()
+        cls.hits = 0
+        cls.misses = 0
+        return
+
+### precomputed nearest-station lookup grid
+
+# lookup grid folders written by rtkLookupGrid.save. The version goes up whenever the layout changes.
+GRID_FORMAT = 'rtk_lookup_grid'
+GRID_FORMAT_VERSION = 1
+
+class rtkLookupGrid:
+
+    # Precomputed nearest-station answers for a regular lon/lat grid covering the station network.
+    # Each cell stores the `depth` nearest active stations to its center and their distances. A query looks up the cell of each point, ranks only that cell's stations by exact distance,
+    # and checks the ranking with the triangle inequality: a station not stored for the cell is at least (depth-th stored distance - distance from the point to the cell center) away.
+    # Points where that check fails, near cell edges or outside the grid, are refined with a full rtkStationIndex query. The stored stations come from the same exact index query,
+    # so the answers are always exact.
+
+    distance_margin = 1.0 # meters subtracted from the stored float32 distances in the exactness check, to cover their rounding
+
+    def __init__(self, station_index, bounds = None, cell_size = 0.25, depth = 16, build = True) -> None:
+
+        # station_index is the rtkStationIndex the grid answers for. Its active mask is followed, and cells are recomputed when it changes (see .sync).
+        # bounds is (west, south, east, north) in degrees, and defaults to the active stations' extent plus one cell. cell_size is in degrees.
+
+        self.station_index = station_index
+        self.cell_size = float(cell_size)
+        self.depth = int(depth)
+
+        if bounds is None:
+            active_lon = station_index.lon[station_index.active]
+            active_lat = station_index.lat[station_index.active]
+            if len(active_lon) == 0:
+                raise Exception("the lookup grid needs at least one active station to find its bounds. Give bounds explicitly.")
+            bounds = (active_lon.min() - self.cell_size, active_lat.min() - self.cell_size, active_lon.max() + self.cell_size, active_lat.max() + self.cell_size)
+        self.west, self.south, east, north = (float(value) for value in bounds)
+        self.num_columns = max(1, int(np.ceil((east - self.west) / self.cell_size - 1e-9))) # the small tolerance keeps saved bounds from gaining a column when read back
+        self.num_rows = max(1, int(np.ceil((north - self.south) / self.cell_size - 1e-9)))
+
+        column_centers = self.west + (np.arange(self.num_columns) + 0.5) * self.cell_size
+        row_centers = self.south + (np.arange(self.num_rows) + 0.5) * self.cell_size
+        self.center_lon, self.center_lat = (values.ravel() for values in np.meshgrid(column_centers, row_centers))
+
+        self.cell_positions = np.full((self.num_rows * self.num_columns, self.depth), -1, dtype = np.int32)
+        self.cell_distances = np.full((self.num_rows * self.num_columns, self.depth), np.inf, dtype = np.float32)
+        self.active = station_index.active.copy() # active mask the cells were computed for
+
+        if build == True:
+            self._compute_cells(np.arange(len(self.center_lon)))
+        return
+
+    # the station arrays of the index, so the grid can be used wherever an rtkStationIndex is, including near_table
+    @property
+    def ids(self):
+        return self.station_index.ids
+
+    @property
+    def lon(self):
+        return self.station_index.lon
+
+    @property
+    def lat(self):
+        return self.station_index.lat
+
+    near_table = rtkStationIndex.near_table
+
+    def _compute_cells(self, cells):
+
+        # recomputes the stored stations of the given flat cell numbers with the full index
+
+        positions, distances, _ = self.station_index.query(self.center_lon[cells], self.center_lat[cells], k = self.depth)
+        self.cell_positions[cells] = -1
+        self.cell_distances[cells] = np.inf
+        self.cell_positions[cells, :positions.shape[1]] = positions
+        self.cell_distances[cells, :positions.shape[1]] = distances
+        return
+
+    def sync(self):
+
+        # brings the cells up to date with the active mask of the station index, recomputing only the cells the changed stations can affect.
+        # A station that turned inactive affects the cells that store it. A station that turned active affects the cells whose center is closer to it than their depth-th stored station.
+        # Returns the number of cells recomputed.
+
+        changed = np.flatnonzero(self.active != self.station_index.active)
+        if len(changed) == 0:
+            return 0
+
+        affected = np.zeros(len(self.center_lon), dtype = bool)
+        for position in changed:
+            if self.station_index.active[position] == True:
+                distances, _ = _geodesic_inverse(self.center_lon, self.center_lat, self.lon[position], self.lat[position])
+                affected |= distances < self.cell_distances[:, -1]
+            else:
+                affected |= np.any(self.cell_positions == position, axis = 1)
+
+        cells = np.flatnonzero(affected)
+        if len(cells) > 0:
+            self._compute_cells(cells)
+        self.active = self.station_index.active.copy()
+        return len(cells)
+
+    def query(self, lon, lat, k = 1):
+
+        # same results as rtkStationIndex.query: (positions, distances, angles), each shaped (number of query points, k)
+
+        self.sync()
+        lon = np.atleast_1d(np.asarray(lon, dtype = np.float64))
+        lat = np.atleast_1d(np.asarray(lat, dtype = np.float64))
+        if k > self.depth:
+            return self.station_index.query(lon, lat, k)
+        k = min(int(k), int(self.active.sum()))
+
+        column = np.floor((lon - self.west) / self.cell_size).astype(np.int64)
+        row = np.floor((lat - self.south) / self.cell_size).astype(np.int64)
+        inside = (column >= 0) & (column < self.num_columns) & (row >= 0) & (row < self.num_rows)
+        cells = np.where(inside, row * self.num_columns + column, 0)
+
+        # exact distances from each point to the stations stored for its cell. Padding (-1) only exists when every active station is stored, and is ranked last.
+        candidates = self.cell_positions[cells]
+        padding = candidates < 0
+        candidate_distances, candidate_angles = _geodesic_inverse(lon[:, None], lat[:, None], self.lon[candidates], self.lat[candidates])
+        candidate_distances[padding] = np.inf
+        order = np.argsort(candidate_distances, axis = 1, kind = 'stable')[:, :k]
+
+        positions = np.take_along_axis(candidates, order, axis = 1).astype(np.int64)
+        distances = np.take_along_axis(candidate_distances, order, axis = 1)
+        angles = np.take_along_axis(candidate_angles, order, axis = 1)
+
+        # the check described at the top of the class. A cell that stores fewer than depth stations stores every active station, so its answers are always exact.
+        if k > 0:
+            to_center, _ = _geodesic_inverse(lon, lat, self.center_lon[cells], self.center_lat[cells])
+            unstored_bound = self.cell_distances[cells, -1].astype(np.float64) - to_center - rtkLookupGrid.distance_margin
+            exact = inside & (distances[:, -1] <= unstored_bound)
+        else:
+            exact = inside
+
+        refine = np.flatnonzero(~exact)
+        if len(refine) > 0:
+            positions[refine], distances[refine], angles[refine] = self.station_index.query(lon[refine], lat[refine], k)
+
+        return positions, distances, angles
+
+    def save(self, path_to_grid):
+
+        # writes the grid to a folder: cells.npy (stored station positions), distances.npy, active.npy (the active mask the cells are for) and grid.json with the grid layout.
+        # load memory-maps these files.
+
+        os.makedirs(path_to_grid, exist_ok = True)
+        np.save(os.path.join(path_to_grid, 'cells.npy'), self.cell_positions)
+        np.save(os.path.join(path_to_grid, 'distances.npy'), self.cell_distances)
+        np.save(os.path.join(path_to_grid, 'active.npy'), self.active)
+
+        header = {
+            'format': GRID_FORMAT,
+            'version': GRID_FORMAT_VERSION,
+            'bounds': [self.west, self.south, self.west + self.num_columns * self.cell_size, self.south + self.num_rows * self.cell_size],
+            'cell_size': self.cell_size,
+            'depth': self.depth,
+            'num_stations': len(self.active)
+        }
+        with open(os.path.join(path_to_grid, 'grid.json'), 'w') as file:
+            json.dump(header, file, indent = 2)
+        return
+
+    @classmethod
+    def load(cls, path_to_grid, station_index):
+
+        # reads a grid folder written by save for the given station index (built from the same station catalog). The cell arrays are memory-mapped copy-on-write,
+        # so the files are never modified; if the index's active mask differs from the saved one, only the affected cells are recomputed on the first query.
+
+        with open(os.path.join(path_to_grid, 'grid.json')) as file:
+            header = json.load(file)
+        if header.get('format') != GRID_FORMAT or header.get('version') != GRID_FORMAT_VERSION:
+            raise Exception(f"{path_to_grid} is not a lookup grid with format version {GRID_FORMAT_VERSION}. Build and save it again.")
+        if header['num_stations'] != len(station_index):
+            raise Exception(f"lookup grid {path_to_grid} was built for {header['num_stations']} stations, but the station index has {len(station_index)}. Build and save it again.")
+
+        grid = cls(station_index, bounds = header['bounds'], cell_size = header['cell_size'], depth = header['depth'], build = False)
+        grid.cell_positions = np.load(os.path.join(path_to_grid, 'cells.npy'), mmap_mode = 'c')
+        grid.cell_distances = np.load(os.path.join(path_to_grid, 'distances.npy'), mmap_mode = 'c')
+        grid.active = np.load(os.path.join(path_to_grid, 'active.npy'))
+        return grid
+
+### network RTK triangulation
+
+# network RTK error model: a base error plus a part that grows with the distance to the stations around the site, interpolated over their triangle (see rtkStationTriangulation.network_table)
+NETWORK_HORIZONTAL_ERROR_BASE_MM = 8
+NETWORK_VERTICAL_ERROR_BASE_MM = 15
+NETWORK_ERROR_PPM = 0.5
+
+def _estimate_network_errors(distance_meters):
+
+    # returns (horizontal, vertical) network RTK error estimates in millimeters for interpolated distances in meters
+    distance_meters = np.asarray(distance_meters, dtype = np.float64)
+    ppm_part = NETWORK_ERROR_PPM * distance_meters / 1000
+    return NETWORK_HORIZONTAL_ERROR_BASE_MM + ppm_part, NETWORK_VERTICAL_ERROR_BASE_MM + ppm_part
+
+class rtkStationTriangulation:
+
+    # Delaunay triangulation of the active stations of an rtkStationIndex, for network RTK, where the accuracy at a site depends on the triangle of stations around it.
+    # Stations are projected stereographically from the center of the network. That projection maps circles on the sphere to circles, so the triangulation is Delaunay on the sphere as well.
+    # The mesh is built by inserting the stations one at a time (Bowyer-Watson: the triangles whose circumcircle contains the new station are replaced by a fan around it), inside three
+    # far away super vertices, so every station has a closed ring of neighbors. Removing a station fills its ring back in with Delaunay ears. So .sync only changes the triangles around the
+    # stations whose active flag changed, and the triangulation can be attached to an rtkStatusRefresher like an rtkLookupGrid.
+    # Queries use the triangles between stations (.triangles), bucketed on a grid, and test each point against its cell's triangles with vectorized barycentric coordinates.
+
+    super_scale = 1000.0 # distance of the super vertices from the center, in extents of the network
+    inside_tolerance = 1e-12 # barycentric coordinates this far below 0 still count as inside, so points on a shared edge are not lost to rounding
+
+    def __init__(self, station_index, build = True) -> None:
+
+        # station_index is the rtkStationIndex the triangulation is built on. Its active mask is followed (see .sync).
+
+        self.station_index = station_index
+        num_stations = len(station_index)
+        if num_stations == 0:
+            raise Exception("the triangulation needs at least one station")
+
+        # stereographic projection from the center of all stations (not only the active ones, so stations turned active later fit the same projection)
+        center = station_index.unit_vectors.sum(axis = 0)
+        center = center / np.linalg.norm(center)
+        east = np.cross([0.0, 0.0, 1.0], center)
+        east = east / np.linalg.norm(east) if np.linalg.norm(east) > 1e-12 else np.array([1.0, 0.0, 0.0])
+        north = np.cross(center, east)
+        self._projection = (center, east, north)
+        x, y = self._project_vectors(station_index.unit_vectors)
+
+        # the super vertices come after the stations, at positions num_stations to num_stations + 2, in counterclockwise order
+        center_x, center_y = (x.min() + x.max()) / 2, (y.min() + y.max()) / 2
+        extent = max(x.max() - x.min(), y.max() - y.min(), 1e-9) * rtkStationTriangulation.super_scale
+        super_angles = np.radians([90.0, 210.0, 330.0])
+        self._x = np.concatenate([x, center_x + extent * np.cos(super_angles)])
+        self._y = np.concatenate([y, center_y + extent * np.sin(super_angles)])
+
+        # the mesh: triangle id -> counterclockwise (a, b, c), directed edge (a, b) -> id of the triangle it belongs to, and the ids of the triangles around every vertex
+        self._triangles = {}
+        self._edge_triangle = {}
+        self._vertex_triangles = [set() for _ in range(num_stations + 3)]
+        self._next_id = 0
+        self._last = None
+        self._add_triangle(num_stations, num_stations + 1, num_stations + 2)
+
+        self.in_mesh = np.zeros(num_stations, dtype = bool) # stations that are vertices of the mesh. An active station is left out only if another one is at the same place.
+        self.active = np.zeros(num_stations, dtype = bool) # active mask the mesh was built for
+        if build == True:
+            self.sync()
+        return
+
+    def _project_vectors(self, unit_vectors):
+
+        center, east, north = self._projection
+        scale = 2 / np.maximum(1 + unit_vectors @ center, 1e-12)
+        return scale * (unit_vectors @ east), scale * (unit_vectors @ north)
+
+    def _orient(self, a, b, x, y):
+
+        # positive if (x, y) is left of the directed edge a -> b
+        return (self._x[b] - self._x[a]) * (y - self._y[a]) - (self._y[b] - self._y[a]) * (x - self._x[a])
+
+    def _in_circumcircle(self, triangle, x, y):
+
+        # True if (x, y) is strictly inside the circumcircle of the counterclockwise triangle
+        a, b, c = triangle
+        ax, ay = self._x[a] - x, self._y[a] - y
+        bx, by = self._x[b] - x, self._y[b] - y
+        cx, cy = self._x[c] - x, self._y[c] - y
+        return ((ax * ax + ay * ay) * (bx * cy - cx * by) - (bx * bx + by * by) * (ax * cy - cx * ay) + (cx * cx + cy * cy) * (ax * by - bx * ay)) > 0
+
+    def _add_triangle(self, a, b, c):
+
+        triangle_id = self._next_id
+        self._next_id += 1
+        self._triangles[triangle_id] = (a, b, c)
+        for edge in ((a, b), (b, c), (c, a)):
+            self._edge_triangle[edge] = triangle_id
+        for vertex in (a, b, c):
+            self._vertex_triangles[vertex].add(triangle_id)
+        self._last = triangle_id
+        return
+
+    def _remove_triangle(self, triangle_id):
+
+        a, b, c = self._triangles.pop(triangle_id)
+        for edge in ((a, b), (b, c), (c, a)):
+            del self._edge_triangle[edge]
+        for vertex in (a, b, c):
+            self._vertex_triangles[vertex].discard(triangle_id)
+        return
+
+    def _locate(self, x, y):
+
+        # walks from the last triangle created towards (x, y), crossing any edge (x, y) is to the right of. Ends at the triangle containing (x, y).
+        # Stations are inserted in spatial order, so the walks are short.
+        triangle_id = self._last if self._last in self._triangles else next(iter(self._triangles))
+        for _ in range(len(self._triangles) + 1):
+            a, b, c = self._triangles[triangle_id]
+            for u, v in ((a, b), (b, c), (c, a)):
+                if self._orient(u, v, x, y) < 0:
+                    triangle_id = self._edge_triangle[(v, u)]
+                    break
+            else:
+                return triangle_id
+        raise Exception("could not locate a station in the triangulation")
+
+    def _insert(self, position):
+
+        # adds a station to the mesh. Returns False (and leaves it out) if another station of the mesh is at the same place.
+        x, y = self._x[position], self._y[position]
+        triangle_id = self._locate(x, y)
+        for vertex in self._triangles[triangle_id]:
+            if (self._x[vertex] == x) and (self._y[vertex] == y):
+                return False
+
+        # the cavity: every triangle whose circumcircle contains the station. It is connected, so it is found by spreading out from the containing triangle.
+        cavity = {triangle_id}
+        stack = [triangle_id]
+        while len(stack) > 0:
+            a, b, c = self._triangles[stack.pop()]
+            for u, v in ((a, b), (b, c), (c, a)):
+                neighbor = self._edge_triangle.get((v, u))
+                if (neighbor is not None) and (neighbor not in cavity) and self._in_circumcircle(self._triangles[neighbor], x, y):
+                    cavity.add(neighbor)
+                    stack.append(neighbor)
+
+        boundary = [(u, v) for triangle_id in cavity for u, v in self._edges(triangle_id) if self._edge_triangle.get((v, u)) not in cavity]
+        for triangle_id in cavity:
+            self._remove_triangle(triangle_id)
+        for u, v in boundary:
+            self._add_triangle(u, v, position)
+        self.in_mesh[position] = True
+        return True
+
+    def _edges(self, triangle_id):
+
+        a, b, c = self._triangles[triangle_id]
+        return ((a, b), (b, c), (c, a))
+
+    def _remove(self, position):
+
+        # removes a station from the mesh, and fills the ring of its neighbors back in one ear at a time: three consecutive neighbors that turn counterclockwise
+        # and whose circumcircle has no other neighbor inside. Those ears are the Delaunay triangles of the ring, which are the ones of the whole mesh without the station.
+        following = {}
+        for triangle_id in list(self._vertex_triangles[position]):
+            a, b, c = self._triangles[triangle_id]
+            a, b, c = (a, b, c) if a == position else ((b, c, a) if b == position else (c, a, b))
+            following[b] = c
+            self._remove_triangle(triangle_id)
+
+        ring = [next(iter(following))]
+        while following[ring[-1]] != ring[0]:
+            ring.append(following[ring[-1]])
+
+        while len(ring) > 3:
+            for i in range(len(ring)):
+                a, b, c = ring[i - 1], ring[i], ring[(i + 1) % len(ring)]
+                if self._orient(a, b, self._x[c], self._y[c]) <= 0:
+                    continue
+                if any(self._in_circumcircle((a, b, c), self._x[other], self._y[other]) for other in ring if other not in (a, b, c)):
+                    continue
+                self._add_triangle(a, b, c)
+                ring.pop(i)
+                break
+            else:
+                raise Exception("could not fill in the neighbors of a removed station")
+        self._add_triangle(*ring)
+        self.in_mesh[position] = False
+        return
+
+    def sync(self):
+
+        # brings the mesh up to date with the active mask of the station index: stations that turned inactive are removed and stations that turned active are inserted.
+        # Then rebuilds .triangles and the query buckets from the mesh with array operations. Returns the number of stations removed and inserted.
+
+        active = self.station_index.active
+        removed = np.flatnonzero(~active & self.in_mesh)
+        for position in removed.tolist():
+            self._remove(position)
+
+        # new stations are inserted in the order of a snaking walk over a coarse grid, so each insertion starts its walk near the last one
+        inserted = np.flatnonzero(active & ~self.in_mesh)
+        if len(inserted) > 0:
+            x, y = self._x[inserted], self._y[inserted]
+            cell_size = max(x.max() - x.min(), y.max() - y.min(), 1e-12) / max(1.0, np.sqrt(len(inserted) / 4))
+            row = np.floor((y - y.min()) / cell_size)
+            column = np.floor((x - x.min()) / cell_size)
+            column = np.where(row % 2 == 0, column, -column)
+            for position in inserted[np.lexsort((x, column, row))].tolist():
+                self._insert(position)
+
+        self.active = active.copy()
+        self._build_buckets()
+        return len(removed) + len(inserted)
+
+    def _build_buckets(self):
+
+        # .triangles are the triangles between stations (none of their corners is a super vertex), as station positions.
+        # Each one is listed in every grid cell its bounding box overlaps, with about one triangle per cell on average.
+
+        num_stations = len(self.in_mesh)
+        triangles = np.array(list(self._triangles.values()), dtype = np.int64).reshape(-1, 3)
+        self.triangles = triangles[(triangles < num_stations).all(axis = 1)]
+        self._triangle_x = self._x[self.triangles]
+        self._triangle_y = self._y[self.triangles]
+        if len(self.triangles) == 0:
+            self._bucket_start = None
+            return
+
+        low_x, high_x = self._triangle_x.min(axis = 1), self._triangle_x.max(axis = 1)
+        low_y, high_y = self._triangle_y.min(axis = 1), self._triangle_y.max(axis = 1)
+        self._grid_origin = (low_x.min(), low_y.min())
+        self._cell_size = max(np.sqrt((high_x.max() - self._grid_origin[0]) * (high_y.max() - self._grid_origin[1]) / len(self.triangles)), 1e-12)
+        self._num_columns = int((high_x.max() - self._grid_origin[0]) // self._cell_size) + 1
+        num_rows = int((high_y.max() - self._grid_origin[1]) // self._cell_size) + 1
+
+        first_column = ((low_x - self._grid_origin[0]) // self._cell_size).astype(np.int64)
+        first_row = ((low_y - self._grid_origin[1]) // self._cell_size).astype(np.int64)
+        num_columns = ((high_x - self._grid_origin[0]) // self._cell_size).astype(np.int64) - first_column + 1
+        counts = num_columns * (((high_y - self._grid_origin[1]) // self._cell_size).astype(np.int64) - first_row + 1)
+
+        # one (cell, triangle) pair for every cell of every triangle's bounding box
+        pair_triangle = np.repeat(np.arange(len(self.triangles)), counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_cell = (np.repeat(first_row, counts) + offset // np.repeat(num_columns, counts)) * self._num_columns + np.repeat(first_column, counts) + offset % np.repeat(num_columns, counts)
+
+        order = np.argsort(pair_cell, kind = 'stable')
+        self._bucket_triangles = pair_triangle[order]
+        self._bucket_start = np.concatenate([[0], np.cumsum(np.bincount(pair_cell, minlength = self._num_columns * num_rows))])
+        return
+
+    def locate(self, lon, lat):
+
+        # returns (positions, weights), each shaped (number of points, 3): the stations at the corners of the triangle enclosing each point, and the barycentric weight of each corner.
+        # Points outside the hull of the active stations get positions of -1 and weights of NaN.
+
+        lon = np.atleast_1d(np.asarray(lon, dtype = np.float64))
+        lat = np.atleast_1d(np.asarray(lat, dtype = np.float64))
+        positions = np.full((len(lon), 3), -1, dtype = np.int64)
+        weights = np.full((len(lon), 3), np.nan)
+        if self._bucket_start is None:
+            return positions, weights
+
+        x, y = self._project_vectors(_to_unit_vectors(lon, lat))
+        column = np.floor((x - self._grid_origin[0]) / self._cell_size)
+        row = np.floor((y - self._grid_origin[1]) / self._cell_size)
+        in_grid = (column >= 0) & (column < self._num_columns) & (row >= 0) & (row < (len(self._bucket_start) - 1) // self._num_columns)
+        cell = np.where(in_grid, row * self._num_columns + column, 0).astype(np.int64)
+        starts = self._bucket_start[cell]
+        counts = np.where(in_grid, self._bucket_start[cell + 1] - starts, 0)
+
+        # barycentric coordinates of every point in every triangle of its cell
+        pair_point = np.repeat(np.arange(len(lon)), counts)
+        pair_triangle = self._bucket_triangles[np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)]
+        corner_x, corner_y = self._triangle_x[pair_triangle], self._triangle_y[pair_triangle]
+        point_x, point_y = x[pair_point], y[pair_point]
+        determinant = (corner_y[:, 1] - corner_y[:, 2]) * (corner_x[:, 0] - corner_x[:, 2]) + (corner_x[:, 2] - corner_x[:, 1]) * (corner_y[:, 0] - corner_y[:, 2])
+        first = ((corner_y[:, 1] - corner_y[:, 2]) * (point_x - corner_x[:, 2]) + (corner_x[:, 2] - corner_x[:, 1]) * (point_y - corner_y[:, 2])) / determinant
+        second = ((corner_y[:, 2] - corner_y[:, 0]) * (point_x - corner_x[:, 2]) + (corner_x[:, 0] - corner_x[:, 2]) * (point_y - corner_y[:, 2])) / determinant
+        pair_weights = np.column_stack((first, second, 1 - first - second))
+
+        # the first enclosing triangle of each point
+        inside = np.flatnonzero((pair_weights >= -rtkStationTriangulation.inside_tolerance).all(axis = 1))
+        points, first_inside = np.unique(pair_point[inside], return_index = True)
+        positions[points] = self.triangles[pair_triangle[inside[first_inside]]]
+        weights[points] = np.clip(pair_weights[inside[first_inside]], 0, 1)
+        return positions, weights
+
+    def network_table(self, lon, lat, in_fids = None):
+
+        # network RTK estimates as a pandas DataFrame, one row per point: the IN_FID and location of the point, whether it is inside the network (in_network),
+        # the three stations around it (NEAR_FID_1..3 from the index ids) with their geodesic distances (NEAR_DIST_1..3) and barycentric weights (WEIGHT_1..3),
+        # the network_distance_meters (the distances interpolated with the weights), and the horizontal and vertical network error estimates for that distance.
+        # Outside the hull of the active stations there is no network solution, so the three nearest stations are reported with weights of 1, 0 and 0,
+        # and the errors are the single-base estimates for the nearest one (see _estimate_errors).
+
+        lon = np.atleast_1d(np.asarray(lon, dtype = np.float64))
+        lat = np.atleast_1d(np.asarray(lat, dtype = np.float64))
+        in_fids = np.arange(1, len(lon) + 1) if in_fids is None else np.asarray(in_fids)
+        if self.in_mesh.sum() < 3:
+            raise Exception("network RTK needs at least three active stations at different places")
+
+        positions, weights = self.locate(lon, lat)
+        in_network = positions[:, 0] >= 0
+        distances = np.empty((len(lon), 3))
+        distances[in_network], _ = _geodesic_inverse(lon[in_network, None], lat[in_network, None], self.station_index.lon[positions[in_network]], self.station_index.lat[positions[in_network]])
+
+        outside = np.flatnonzero(~in_network)
+        positions[outside], distances[outside], _ = self.station_index.query(lon[outside], lat[outside], k = 3)
+        weights[outside] = [1.0, 0.0, 0.0]
+
+        network_distance = (weights * distances).sum(axis = 1)
+        horizontal_error, vertical_error = _estimate_network_errors(network_distance)
+        horizontal_error[outside], vertical_error[outside] = _estimate_errors(network_distance[outside])
+
+        network_table = pd.DataFrame({'IN_FID': in_fids, 'FROM_X': lon, 'FROM_Y': lat, 'in_network': in_network})
+        for column, values in (('NEAR_FID', self.station_index.ids[positions]), ('NEAR_DIST', distances), ('WEIGHT', weights)):
+            for corner in range(3):
+                network_table[f'{column}_{corner + 1}'] = values[:, corner]
+        network_table['network_distance_meters'] = network_distance
+        network_table['horizontal_error_est'] = horizontal_error
+        network_table['vertical_error_est'] = vertical_error
+        return network_table
+
+### station status feed
+
+def _read_status_feed(path_to_feed):
+
+    # reads a station status feed into (pnum, status) arrays. The feed is a local file standing in for the EarthScope realtime status page:
+    # a .csv with pnum and status columns (any letter case), or a .json list of {"pnum": ..., "status": ...} objects or a {pnum: status} object.
+    # If a station is listed more than once, its last status is used.
+
+    if path_to_feed.lower().endswith('.json'):
+        with open(path_to_feed) as file:
+            feed = json.load(file)
+        if type(feed) is dict:
+            feed = [{'pnum': pnum, 'status': status} for pnum, status in feed.items()]
+        feed = pd.DataFrame(feed)
+    else:
+        feed = pd.read_csv(path_to_feed, dtype = str, keep_default_na = False)
+
+    feed = feed.rename(columns = {column: column.lower() for column in feed.columns})
+    if ('pnum' not in feed.columns) or ('status' not in feed.columns):
+        raise Exception(f"status feed {path_to_feed} needs pnum and status columns (or keys), but has {list(feed.columns)}")
+    feed = feed.drop_duplicates(subset = 'pnum', keep = 'last')
+    return feed['pnum'].to_numpy().astype(str), feed['status'].to_numpy().astype(str)
+
+class rtkStatusRefresher:
+
+    # keeps the station status of a station catalog up to date from a status feed file, for refreshing every minute or so during flight operations.
+    # .status is the current status of every station, .station_index its rtkStationIndex (OK stations active), and .realtime_table the catalog's attributes with the current status.
+    # Each refresh reads the feed, finds the stations whose status changed, and applies only those: to .status and .realtime_table, to the active mask of .station_index,
+    # and to every structure attached with .attach (anything with a sync() method that follows the index's active mask, like an rtkLookupGrid or an rtkStationTriangulation).
+    # So besides reading the feed, a refresh costs time in proportion to the number of changes, and nothing is rebuilt. The catalog itself is never modified.
+
+    def __init__(self, catalog, path_to_feed: str) -> None:
+
+        self.catalog = catalog
+        self.path_to_feed = path_to_feed
+        self.status = np.array(catalog.columns['status'], dtype = object)
+        self.station_index = catalog.station_index(status = self.status)
+        self.realtime_table = catalog.to_frame()
+        self.realtime_table['status'] = self.status
+        self.structures = []
+
+        self.position_of_pnum = pd.Index(np.asarray(catalog.columns['pnum']).astype(str))
+        self.feed_signature = None
+        self.refreshes = 0
+        self.last_refresh = None
+        self.last_changes = pd.DataFrame(columns = ['pnum', 'old_status', 'new_status'])
+        self.unknown_stations = []
+        return
+
+    def attach(self, structure):
+
+        # structure is updated after every refresh that changed the active stations. It is synced once here, in case the index changed since it was built.
+        if not callable(getattr(structure, 'sync', None)):
+            raise Exception("only structures with a sync() method (for example an rtkLookupGrid or an rtkStationTriangulation) can be attached")
+        if structure.station_index is not self.station_index:
+            raise Exception("the structure needs to be built on the refresher's own station_index")
+        structure.sync()
+        self.structures.append(structure)
+        return structure
+
+    def refresh(self, force = False):
+
+        # applies the changes in the feed since the last refresh. Returns the changes as a DataFrame (pnum, old_status, new_status), also kept as .last_changes.
+        # If the feed file has not been modified since the last refresh, it is not read again (unless force = True). Stations in the feed that are not in the catalog are listed in .unknown_stations.
+
+        feed_stat = os.stat(self.path_to_feed)
+        feed_signature = (feed_stat.st_size, feed_stat.st_mtime_ns)
+        if (feed_signature == self.feed_signature) and (force == False):
+            return self.last_changes.iloc[0:0]
+        started = time.perf_counter()
+
+        feed_pnum, feed_status = _read_status_feed(self.path_to_feed)
+        positions = self.position_of_pnum.get_indexer(feed_pnum)
+        known = positions >= 0
+        self.unknown_stations = feed_pnum[~known].tolist()
+
+        positions, feed_status = positions[known], feed_status[known]
+        changed = self.status[positions] != feed_status
+        positions, new_status = positions[changed], feed_status[changed]
+        old_status = self.status[positions]
+
+        if len(positions) > 0:
+            self.status[positions] = new_status
+            self.realtime_table.iloc[positions, self.realtime_table.columns.get_loc('status')] = new_status
+            now_active = new_status == 'OK'
+            was_active = old_status == 'OK'
+            self.station_index.set_active(positions[now_active & ~was_active], True)
+            self.station_index.set_active(positions[was_active & ~now_active], False)
+            if (now_active != was_active).any():
+                for structure in self.structures:
+                    structure.sync()
+
+        self.feed_signature = feed_signature
+        self.refreshes += 1
+        self.last_changes = pd.DataFrame({'pnum': self.position_of_pnum[positions], 'old_status': old_status, 'new_status': new_status})
+        self.last_refresh = {'seconds': time.perf_counter() - started, 'changes': len(positions), 'unknown_stations': len(self.unknown_stations)}
+        return self.last_changes
+
+### nearest-station result cache
+
+RESULT_CACHE_FORMAT = 'rtk_result_cache'
+RESULT_CACHE_FORMAT_VERSION = 1
+
+# columns of a near table that only depend on the query point, the stations and num_close. These are what is cached per centroid; IN_FID, FROM_X, FROM_Y and OBJECTID are filled in per run.
+RESULT_CACHE_COLUMNS = ['NEAR_FID', 'NEAR_DIST', 'NEAR_X', 'NEAR_Y', 'NEAR_ANGLE', 'NEAR_RANK']
+
+class rtkResultCache:
+
+    # LRU cache of nearest-station results, for planners re-running the same (or nearly the same) sites with the same settings.
+    # The key of a result is its centroid rounded to tolerance_degrees, num_close, and a hash of the effective station status (which stations are OK after stations_ok and stations_unavailable),
+    # the value is the centroid's num_close near table rows. At most max_entries results are kept, and the least recently used one is dropped first.
+    # Results are only valid for one station catalog: when the catalog changes (a different source, or the same source changed on disk), the cache empties itself.
+    # With path, the cache is read from that file when created (if it exists) and written back by save. The file is a pickle, so only load cache files you wrote yourself.
+
+    def __init__(self, max_entries: int = 10000, tolerance_degrees: float = 1e-6, path: str = None) -> None:
+
+        if (type(max_entries) is not int) or (max_entries < 1):
+            raise Exception("max_entries needs to be a positive integer")
+        if (type(tolerance_degrees) not in (int, float)) or (tolerance_degrees <= 0):
+            raise Exception("tolerance_degrees needs to be a positive number")
+
+        self.max_entries = max_entries
+        self.tolerance_degrees = tolerance_degrees
+        self.path = path
+        self.catalog_key = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if (path is not None) and os.path.exists(path):
+            self._read(path)
+        return
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def status_hash(pnum, status):
+
+        # hash of the set of OK stations, so two runs with different stations_ok / stations_unavailable lists that end up with the same usable stations share results
+        usable = np.sort(np.asarray(pnum)[np.asarray(status) == 'OK'].astype(str))
+        return hashlib.sha1('\n'.join(usable).encode()).hexdigest()
+
+    def key(self, lon, lat, num_close, status_hash):
+        return (int(round(lon / self.tolerance_degrees)), int(round(lat / self.tolerance_degrees)), num_close, status_hash)
+
+    def validate(self, catalog):
+
+        # empties the cache if it holds results for a different station catalog (or for an older version of the same one)
+        catalog_key = (catalog.source, catalog.signature)
+        if catalog_key != self.catalog_key:
+            self.entries.clear()
+            self.catalog_key = catalog_key
+        return
+
+    def get(self, key):
+
+        # the cached near table rows for key (a numpy record array), or None
+        rows = self.entries.get(key)
+        if rows is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return rows
+
+    def put(self, key, rows):
+        self.entries[key] = rows
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last = False)
+        return
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        return
+
+    def cache_info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'max_entries': self.max_entries}
+
+    def save(self, path = None):
+
+        # writes the cache to path (default: the path it was created with), next to it first and then moved into place, so a cache file is never half written
+        path = self.path if path is None else path
+        if path is None:
+            raise Exception("the result cache has no path to save to")
+
+        contents = {
+            'format': RESULT_CACHE_FORMAT,
+            'version': RESULT_CACHE_FORMAT_VERSION,
+            'tolerance_degrees': self.tolerance_degrees,
+            'catalog_key': self.catalog_key,
+            'entries': list(self.entries.items())
+        }
+        import pickle
+        temporary_path = f"{path}.writing"
+        with open(temporary_path, 'wb') as file:
+            pickle.dump(contents, file, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+        return
+
+    def _read(self, path):
+
+        import pickle
+        with open(path, 'rb') as file:
+            contents = pickle.load(file)
+        if contents.get('format') != RESULT_CACHE_FORMAT or contents.get('version') != RESULT_CACHE_FORMAT_VERSION:
+            raise Exception(f"{path} is not a result cache with format version {RESULT_CACHE_FORMAT_VERSION}. Delete it and let it be written again.")
+
+        # results rounded to another tolerance would never be found, so they are not kept
+        if contents['tolerance_degrees'] != self.tolerance_degrees:
+            return
+        self.catalog_key = contents['catalog_key']
+        for key, rows in contents['entries'][-self.max_entries:]:
+            self.entries[key] = rows
+        return
+
+### station status overrides
+
+def _apply_status_overrides(pnum, status, stations_ok, stations_unavailable, print_changes = True):
+
+    # returns a copy of status with the stations in stations_ok set to 'OK', then the stations in stations_unavailable set to 'Status Unavailable'.
+    # Station names are resolved through a pnum -> index dict, and names that are not in pnum raise an Exception listing all of them. Every change is printed, unless print_changes is False.
+
+    index_of_pnum = {}
+    for idx, name in enumerate(pnum):
+        index_of_pnum.setdefault(name, idx) # first match, if a name appears twice
+
+    unknown_names = [name for name in list(stations_ok) + list(stations_unavailable) if name not in index_of_pnum]
+    if len(unknown_names) > 0:
+        raise Exception(f"These station names were not found in the pnum field of realtime_points: {', '.join(unknown_names)}. Check the spelling of stations_ok and stations_unavailable.")
+
+    status = np.array(status, dtype = object)
+    for name in stations_ok:
+        if print_changes == True:
+            print(f'changing station {name} (row index {index_of_pnum[name]}) to OK')
+        status[index_of_pnum[name]] = 'OK'
+    for name in stations_unavailable:
+        if print_changes == True:
+            print(f'changing station {name} (row index {index_of_pnum[name]}) to Status Unavailable')
+        status[index_of_pnum[name]] = 'Status Unavailable'
+
+    return status
+
+### error model and output statistics
+
+# single-baseline RTK error model, in millimeters: a fixed part plus 1 ppm of the distance to the base station.
+HORIZONTAL_ERROR_BASE_MM = 8
+VERTICAL_ERROR_BASE_MM = 15
+ERROR_PPM = 1
+
+# edges of the compass direction bins for NEAR_ANGLE, and the direction of each bin. Odd bins are the diagonal directions.
+DIRECTION_EDGES = np.array([-157.5, -112.5, -67.5, -22.5, 22.5, 67.5, 112.5, 157.5])
+DIRECTION_NAMES = np.array(['South', 'Southwest', 'West', 'Northwest', 'North', 'Northeast', 'East', 'Southeast', 'South'])
+
+def _estimate_errors(distance_meters):
+
+    # returns (horizontal, vertical) error estimates in millimeters for distances in meters. 1 ppm of a distance in meters is distance / 1000 millimeters.
+
+    distance_meters = np.asarray(distance_meters, dtype = np.float64)
+    ppm_part = ERROR_PPM * distance_meters / 1000
+    return HORIZONTAL_ERROR_BASE_MM + ppm_part, VERTICAL_ERROR_BASE_MM + ppm_part
+
+def _compass_directions(angles):
+
+    # bins geodesic NEAR_ANGLE values (0 = North, 90 = East, -90 = West) into compass directions.
+    # These are only valid if the near table is geodesic. If it is modified to use planar, meanings of angles change.
+    # An angle exactly on a bin edge belongs to the diagonal direction, as in the original if chain. The bins cover every angle, so there is no gap between West and Northwest.
+
+    angles = np.asarray(angles, dtype = np.float64)
+    bins_left = np.digitize(angles, DIRECTION_EDGES, right = False)
+    bins_right = np.digitize(angles, DIRECTION_EDGES, right = True)
+    bins = np.where(bins_left % 2 == 1, bins_left, bins_right)
+    return DIRECTION_NAMES[bins]
+
+def _build_near_stats(near_table, realtime_pd):
+
+    # joins the station attributes onto a near table on NEAR_FID, and adds the error estimates and directions for every row.
+    # Returns one row per near table row, in near table order, with flight_OID (the IN_FID of the flight feature), NEAR_RANK, NEAR_ANGLE and direction in front of the station attributes.
+    # The join looks up the row of every NEAR_FID once and takes the station rows by position, which is much faster than a pandas merge for the small near tables of single runs.
+
+    positions = pd.Index(realtime_pd['OBJECTID']).get_indexer(near_table['NEAR_FID'])
+    if (positions < 0).any():
+        raise Exception("the near table has NEAR_FIDs that are not OBJECTIDs of the realtime points")
+
+    distances = near_table['NEAR_DIST'].to_numpy()
+    angles = near_table['NEAR_ANGLE'].to_numpy()
+    horizontal_error, vertical_error = _estimate_errors(distances)
+
+    near_columns = pd.DataFrame({'flight_OID': near_table['IN_FID'].to_numpy(), 'NEAR_RANK': near_table['NEAR_RANK'].to_numpy(), 'NEAR_ANGLE': angles})
+    stations = realtime_pd.take(positions).reset_index(drop = True)
+    statistics = pd.DataFrame({
+        'direction': _compass_directions(angles),
+        'horizontal_error_est': horizontal_error,
+        'vertical_error_est': vertical_error,
+        'distance_meters': distances
+    })
+    return pd.concat([near_columns, stations, statistics], axis = 1)
+
+### output feature classes
+
+def _output_field(name, values):
+
+    # the AddFields description of an output field for a column of values: integers as LONG, floats as DOUBLE, anything else as TEXT
+    kind = np.asarray(values).dtype.kind
+    if kind in 'iub':
+        return [name, 'LONG']
+    if kind == 'f':
+        return [name, 'DOUBLE']
+    return [name, 'TEXT', '', 255]
+
+def _prepare_output_class(path_to_gdb, name, geometry_type, fields, append = False):
+
+    # creates the WGS84 feature class name in path_to_gdb with its whole schema (fields, a list of AddFields descriptions) in two tool calls, and returns its path.
+    # With append = True an existing class with all of the fields is kept as it is, so the rows of many runs can be written into one class.
+
+    path = rf"{path_to_gdb}\{name}"
+    if (append == True) and arcpy.Exists(path):
+        existing = [field.name for field in arcpy.ListFields(path)]
+        missing = [field[0] for field in fields if field[0] not in existing]
+        if len(missing) > 0:
+            raise Exception(f"{path} already exists without the fields {missing}, so these results cannot be added to it. Rename or delete it first.")
+        return path
+
+    arcpy.management.CreateFeatureclass(out_path = path_to_gdb, out_name = name, geometry_type = geometry_type, spatial_reference = arcpy.SpatialReference(4326))
+    arcpy.management.AddFields(in_table = path, field_description = fields)
+    return path
+
+def _insert_rows(path, shapes, table):
+
+    # writes one feature per row of table (a pandas DataFrame named like the fields of path) with shapes[i] as its geometry, through a single insert cursor.
+    # Columns are converted with .tolist() so the cursor gets python values instead of numpy scalars.
+
+    names = list(table.columns)
+    columns = [table[name].to_numpy().tolist() for name in names]
+    with arcpy.da.InsertCursor(path, ['SHAPE@'] + names) as cursor:
+        for shape, values in zip(shapes, zip(*columns)):
+            cursor.insertRow((shape,) + values)
+    return
+
+### streaming along-track coverage
+
+def _from_unit_vectors(vectors):
+
+    # inverse of _to_unit_vectors, returns (lon, lat) in degrees
+    lon = np.degrees(np.arctan2(vectors[:, 1], vectors[:, 0]))
+    lat = np.degrees(np.arctan2(vectors[:, 2], np.hypot(vectors[:, 0], vectors[:, 1])))
+    return lon, lat
+
+def _densify_paths(paths, spacing_meters, chunk_size):
+
+    # generator over the densified vertices of paths (a list of (lon, lat) vertex arrays, one per polyline part or polygon ring).
+    # Every segment between two vertices gets points at most spacing_meters apart, including both of its ends, interpolated along the great circle.
+    # Yields (segment_ids, lon, lat) chunks of at most chunk_size points, where segment_ids number the segments of all paths in order. Even a single very long segment is split across chunks,
+    # so memory stays bounded no matter how long the track or how small the spacing.
+
+    chunk_ids, chunk_vectors = [], []
+    num_in_chunk = 0
+    segment_id = 0
+
+    for path_lon, path_lat in paths:
+        path_vectors = _to_unit_vectors(path_lon, path_lat)
+        lengths, _ = _geodesic_inverse(path_lon[:-1], path_lat[:-1], path_lon[1:], path_lat[1:])
+
+        for start_vector, end_vector, length in zip(path_vectors[:-1], path_vectors[1:], lengths):
+            num_steps = max(1, int(np.ceil(length / spacing_meters)))
+            omega = np.arccos(np.clip(start_vector @ end_vector, -1, 1))
+
+            for first_step in range(0, num_steps + 1, chunk_size):
+                steps = np.arange(first_step, min(first_step + chunk_size, num_steps + 1))
+                t = (steps / num_steps)[:, None]
+                if omega < 1e-12:
+                    vectors = start_vector + t * (end_vector - start_vector)
+                else:
+                    vectors = (np.sin((1 - t) * omega) * start_vector + np.sin(t * omega) * end_vector) / np.sin(omega)
+
+                # fill the current chunk, yielding it whenever it is full
+                while len(vectors) > 0:
+                    take = min(chunk_size - num_in_chunk, len(vectors))
+                    chunk_vectors.append(vectors[:take])
+                    chunk_ids.append(np.full(take, segment_id, dtype = np.int64))
+                    num_in_chunk += take
+                    vectors = vectors[take:]
+                    if num_in_chunk == chunk_size:
+                        lon, lat = _from_unit_vectors(np.concatenate(chunk_vectors))
+                        yield np.concatenate(chunk_ids), lon, lat
+                        chunk_ids, chunk_vectors = [], []
+                        num_in_chunk = 0
+
+            segment_id += 1
+
+    if num_in_chunk > 0:
+        lon, lat = _from_unit_vectors(np.concatenate(chunk_vectors))
+        yield np.concatenate(chunk_ids), lon, lat
+
+def _along_track_coverage(paths, station_index, spacing_meters = 100.0, chunk_size = 10000):
+
+    # streams the densified paths through the station index, one chunk at a time, and keeps running per-segment aggregates of the distance to the nearest usable station.
+    # Returns a DataFrame with one row per segment: its part and end vertices, the number of densified points, mean and max distance, where the max happens and to which station,
+    # and the horizontal / vertical error estimates (same error model as _get_output_stats) at the mean and at the max.
+
+    paths = [(np.asarray(path_lon, dtype = np.float64), np.asarray(path_lat, dtype = np.float64)) for path_lon, path_lat in paths if len(path_lon) >= 2]
+    num_segments = sum(len(path_lon) - 1 for path_lon, _ in paths)
+
+    num_points = np.zeros(num_segments, dtype = np.int64)
+    distance_sum = np.zeros(num_segments)
+    distance_max = np.full(num_segments, -np.inf)
+    worst_position = np.full(num_segments, -1, dtype = np.int64)
+    worst_lon = np.full(num_segments, np.nan)
+    worst_lat = np.full(num_segments, np.nan)
+
+    for segment_ids, lon, lat in _densify_paths(paths, spacing_meters, chunk_size):
+        positions, distances, _ = station_index.query(lon, lat, k = 1)
+        distances = distances[:, 0]
+
+        num_points += np.bincount(segment_ids, minlength = num_segments)
+        distance_sum += np.bincount(segment_ids, weights = distances, minlength = num_segments)
+
+        # the largest distance of each segment in this chunk: sort by segment then distance, and take the last row of each segment
+        order = np.lexsort((distances, segment_ids))
+        last_of_segment = order[np.r_[segment_ids[order][1:] != segment_ids[order][:-1], True]]
+        chunk_segments = segment_ids[last_of_segment]
+        larger = distances[last_of_segment] > distance_max[chunk_segments]
+        update_segments = chunk_segments[larger]
+        update_rows = last_of_segment[larger]
+        distance_max[update_segments] = distances[update_rows]
+        worst_position[update_segments] = positions[update_rows, 0]
+        worst_lon[update_segments] = lon[update_rows]
+        worst_lat[update_segments] = lat[update_rows]
+
+    part_ids = np.concatenate([np.full(len(path_lon) - 1, part_id) for part_id, (path_lon, _) in enumerate(paths)]) if num_segments > 0 else np.zeros(0, dtype = np.int64)
+    vertex_ids = np.concatenate([np.arange(len(path_lon) - 1) for path_lon, _ in paths]) if num_segments > 0 else np.zeros(0, dtype = np.int64)
+    start_lon = np.concatenate([path_lon[:-1] for path_lon, _ in paths]) if num_segments > 0 else np.zeros(0)
+    start_lat = np.concatenate([path_lat[:-1] for _, path_lat in paths]) if num_segments > 0 else np.zeros(0)
+    end_lon = np.concatenate([path_lon[1:] for path_lon, _ in paths]) if num_segments > 0 else np.zeros(0)
+    end_lat = np.concatenate([path_lat[1:] for _, path_lat in paths]) if num_segments > 0 else np.zeros(0)
+
+    distance_mean = distance_sum / np.maximum(num_points, 1)
+    horizontal_mean, vertical_mean = _estimate_errors(distance_mean)
+    horizontal_max, vertical_max = _estimate_errors(distance_max)
+
+    segment_table = pd.DataFrame({
+        'part': part_ids,
+        'segment': vertex_ids,
+        'start_lon': start_lon,
+        'start_lat': start_lat,
+        'end_lon': end_lon,
+        'end_lat': end_lat,
+        'num_points': num_points,
+        'mean_distance_meters': distance_mean,
+        'max_distance_meters': distance_max,
+        'worst_lon': worst_lon,
+        'worst_lat': worst_lat,
+        'worst_NEAR_FID': station_index.ids[worst_position],
+        'horizontal_error_est_mean': horizontal_mean,
+        'vertical_error_est_mean': vertical_mean,
+        'horizontal_error_est_max': horizontal_max,
+        'vertical_error_est_max': vertical_max
+    })
+    return segment_table
+
+### footprint worst-case coverage
+
+FOOTPRINT_SPHERICAL_MARGIN = 0.01 # relative margin between spherical and geodesic distances when finding the farthest vertices (their ratio varies by well under 1% on WGS84)
+
+def _footprint_samples(paths, shape_type, num_samples):
+
+    # about num_samples points spread evenly over a footprint, for the mean and percentile distances: a lon/lat grid over the inside of a Polygon
+    # (every ring tested at once with the even-odd rule, so holes and multipart polygons are handled), or points evenly spaced by length along a Polyline.
+    # Falls back to the vertices when the footprint has no area or no length. Returns (lon, lat).
+
+    vertices_lon = np.concatenate([path_lon for path_lon, _ in paths])
+    vertices_lat = np.concatenate([path_lat for _, path_lat in paths])
+    starts_lon = np.concatenate([path_lon[:-1] for path_lon, _ in paths])
+    starts_lat = np.concatenate([path_lat[:-1] for _, path_lat in paths])
+    ends_lon = np.concatenate([path_lon[1:] for path_lon, _ in paths])
+    ends_lat = np.concatenate([path_lat[1:] for _, path_lat in paths])
+
+    if shape_type == 'Polygon':
+        west, east = vertices_lon.min(), vertices_lon.max()
+        south, north = vertices_lat.min(), vertices_lat.max()
+        lon_scale = max(np.cos(np.radians((south + north) / 2)), 1e-6)
+        spacing_lat = np.sqrt((east - west) * lon_scale * (north - south) / num_samples)
+        if spacing_lat > 0:
+            spacing_lon = spacing_lat / lon_scale
+            grid_lon = west + (np.arange(max(1, int(np.ceil((east - west) / spacing_lon)))) + 0.5) * spacing_lon
+            grid_lat = south + (np.arange(max(1, int(np.ceil((north - south) / spacing_lat)))) + 0.5) * spacing_lat
+
+            # one scanline per grid row: the edges crossing it, and the parity of the crossings west of every grid point
+            sample_lon, sample_lat = [], []
+            for row_lat in grid_lat:
+                crossing = (starts_lat > row_lat) != (ends_lat > row_lat)
+                crossing_lon = starts_lon[crossing] + (row_lat - starts_lat[crossing]) * (ends_lon[crossing] - starts_lon[crossing]) / (ends_lat[crossing] - starts_lat[crossing])
+                inside = np.searchsorted(np.sort(crossing_lon), grid_lon) % 2 == 1
+                sample_lon.append(grid_lon[inside])
+                sample_lat.append(np.full(inside.sum(), row_lat))
+            sample_lon, sample_lat = np.concatenate(sample_lon), np.concatenate(sample_lat)
+            if len(sample_lon) > 0:
+                return sample_lon, sample_lat
+
+    if shape_type == 'Polyline':
+        lengths, _ = _geodesic_inverse(starts_lon, starts_lat, ends_lon, ends_lat)
+        if lengths.sum() > 0:
+            cumulative = np.cumsum(lengths)
+            along = (np.arange(num_samples) + 0.5) / num_samples * cumulative[-1]
+            segments = np.minimum(np.searchsorted(cumulative, along, side = 'right'), len(lengths) - 1)
+            fraction = np.clip((along - (cumulative[segments] - lengths[segments])) / np.where(lengths[segments] > 0, lengths[segments], 1), 0, 1)
+            return starts_lon[segments] + fraction * (ends_lon[segments] - starts_lon[segments]), starts_lat[segments] + fraction * (ends_lat[segments] - starts_lat[segments])
+
+    return vertices_lon, vertices_lat
+
+def _footprint_coverage(paths, shape_type, station_index, k = 1, num_samples = 2000, percentile = 95, chunk_size = 1000000):
+
+    # finds the k active stations with the smallest worst-case (maximum) geodesic distance to a footprint (a list of (lon, lat) vertex arrays: the rings of a polygon or the parts of a polyline).
+    # Over a regional footprint the distance from a station is largest at a vertex (never inside a polygon or along an edge), so the worst case is exact from the vertices alone.
+    #
+    # Stations are pruned first, with bounds from the footprint's bounding box: a station is at most (distance to the box center + the farthest vertex from the center) from every point,
+    # and at least as far as the farthest of the box's extreme vertices. A station whose lower bound is above the k-th smallest upper bound cannot be among the k best.
+    # For the remaining candidates, all vertices are ranked by spherical distance with one matrix product per chunk of about chunk_size station-vertex pairs,
+    # and only the vertices near each candidate's spherical maximum get the exact geodesic distance.
+    #
+    # Returns (table, number of candidates checked exactly). The table has one row per chosen station, best first: its position in the index, NEAR_FID, max_distance_meters and where it is
+    # (worst_lon, worst_lat), mean_distance_meters and p{percentile}_distance_meters over the sample points of _footprint_samples, and the error estimates for the mean, percentile and max.
+
+    vertices_lon = np.concatenate([path_lon for path_lon, _ in paths])
+    vertices_lat = np.concatenate([path_lat for _, path_lat in paths])
+    active_positions = np.flatnonzero(station_index.active)
+    k = min(int(k), len(active_positions))
+    station_lon = station_index.lon[active_positions]
+    station_lat = station_index.lat[active_positions]
+
+    center_lon = (vertices_lon.min() + vertices_lon.max()) / 2
+    center_lat = (vertices_lat.min() + vertices_lat.max()) / 2
+    radius = _geodesic_inverse(vertices_lon, vertices_lat, center_lon, center_lat)[0].max()
+    upper = _geodesic_inverse(station_lon, station_lat, center_lon, center_lat)[0] + radius
+
+    extreme_vertices = np.unique([np.argmin(vertices_lon), np.argmax(vertices_lon), np.argmin(vertices_lat), np.argmax(vertices_lat),
+                                  np.argmin(vertices_lon + vertices_lat), np.argmax(vertices_lon + vertices_lat), np.argmin(vertices_lon - vertices_lat), np.argmax(vertices_lon - vertices_lat)])
+    lower = np.zeros(len(active_positions))
+    for vertex in extreme_vertices:
+        lower = np.maximum(lower, _geodesic_inverse(station_lon, station_lat, vertices_lon[vertex], vertices_lat[vertex])[0])
+    candidates = np.flatnonzero(lower <= np.partition(upper, k - 1)[k - 1])
+
+    worst_distance = np.empty(len(candidates))
+    worst_vertex = np.empty(len(candidates), dtype = np.int64)
+    vertex_vectors = _to_unit_vectors(vertices_lon, vertices_lat)
+    candidate_vectors = _to_unit_vectors(station_lon[candidates], station_lat[candidates])
+    rows_per_chunk = max(1, chunk_size // len(vertices_lon))
+    for start in range(0, len(candidates), rows_per_chunk):
+        stop = min(start + rows_per_chunk, len(candidates))
+        spherical = np.arccos(np.clip(candidate_vectors[start:stop] @ vertex_vectors.T, -1, 1))
+        rows, vertices = np.nonzero(spherical >= spherical.max(axis = 1, keepdims = True) * (1 - FOOTPRINT_SPHERICAL_MARGIN))
+        distances, _ = _geodesic_inverse(station_lon[candidates[start + rows]], station_lat[candidates[start + rows]], vertices_lon[vertices], vertices_lat[vertices])
+
+        # the farthest checked vertex of every row is the last one when sorted by row, then distance
+        order = np.lexsort((distances, rows))
+        last = np.append(np.flatnonzero(np.diff(rows[order]) != 0), len(order) - 1)
+        worst_distance[start:stop] = distances[order[last]]
+        worst_vertex[start:stop] = vertices[order[last]]
+
+    chosen = np.argsort(worst_distance, kind = 'stable')[:k]
+    chosen_positions = active_positions[candidates[chosen]]
+
+    sample_lon, sample_lat = _footprint_samples(paths, shape_type, num_samples)
+    sample_distances = np.stack([_geodesic_inverse(sample_lon, sample_lat, station_index.lon[position], station_index.lat[position])[0] for position in chosen_positions])
+
+    distance_mean = sample_distances.mean(axis = 1)
+    distance_percentile = np.percentile(sample_distances, percentile, axis = 1)
+    horizontal_mean, vertical_mean = _estimate_errors(distance_mean)
+    horizontal_percentile, vertical_percentile = _estimate_errors(distance_percentile)
+    horizontal_max, vertical_max = _estimate_errors(worst_distance[chosen])
+
+    table = pd.DataFrame({
+        'position': chosen_positions,
+        'NEAR_FID': station_index.ids[chosen_positions],
+        'mean_distance_meters': distance_mean,
+        f'p{percentile:g}_distance_meters': distance_percentile,
+        'max_distance_meters': worst_distance[chosen],
+        'worst_lon': vertices_lon[worst_vertex[chosen]],
+        'worst_lat': vertices_lat[worst_vertex[chosen]],
+        'horizontal_error_est_mean': horizontal_mean,
+        'vertical_error_est_mean': vertical_mean,
+        f'horizontal_error_est_p{percentile:g}': horizontal_percentile,
+        f'vertical_error_est_p{percentile:g}': vertical_percentile,
+        'horizontal_error_est_max': horizontal_max,
+        'vertical_error_est_max': vertical_max
+    })
+    return table, len(candidates)
+
+### headless flight input
+
+# GeoJSON geometry types and the feature class shapeType they stand in for
+GEOJSON_SHAPE_TYPES = {'Point': 'Point', 'MultiPoint': 'Multipoint', 'LineString': 'Polyline', 'MultiLineString': 'Polyline', 'Polygon': 'Polygon', 'MultiPolygon': 'Polygon'}
+
+def _read_flight_geometry(flight_geometry):
+
+    # reads flight plans given without a feature class, in WGS84 longitude / latitude, as a list of (fid, GeoJSON geometry) pairs numbered from 1 like OBJECTIDs.
+    # flight_geometry can be a path to a .geojson / .json file, a GeoJSON FeatureCollection, Feature or geometry dict, a single (lon, lat) pair, or a list of (lon, lat) pairs (one Point feature each).
+
+    if type(flight_geometry) is str:
+        with open(flight_geometry) as file:
+            flight_geometry = json.load(file)
+
+    if type(flight_geometry) is dict:
+        if flight_geometry.get('type') == 'FeatureCollection':
+            geometries = [feature.get('geometry') for feature in flight_geometry.get('features', [])]
+        elif flight_geometry.get('type') == 'Feature':
+            geometries = [flight_geometry.get('geometry')]
+        else:
+            geometries = [flight_geometry]
+    else:
+        coordinates = np.asarray(flight_geometry, dtype = np.float64)
+        if coordinates.shape == (2,):
+            coordinates = coordinates.reshape(1, 2)
+        if (coordinates.ndim != 2) or (coordinates.shape[1] != 2):
+            raise Exception("flight_geometry coordinates need to be a (lon, lat) pair or a list of (lon, lat) pairs")
+        geometries = [{'type': 'Point', 'coordinates': [lon, lat]} for lon, lat in coordinates.tolist()]
+
+    for geometry in geometries:
+        if (type(geometry) is not dict) or (geometry.get('type') not in GEOJSON_SHAPE_TYPES) or (len(geometry.get('coordinates', [])) == 0):
+            raise Exception(f"flight_geometry needs to be made of non-empty GeoJSON {', '.join(GEOJSON_SHAPE_TYPES)} geometries in longitude / latitude. GeometryCollection is not supported.")
+    return list(enumerate(geometries, start = 1))
+
+def _geometry_parts(geometry):
+
+    # the parts of a GeoJSON geometry as (n, 2) arrays: every point of a Point / MultiPoint, every line of a (Multi)LineString, and every ring of a (Multi)Polygon (exterior first, then holes)
+    geometry_type, coordinates = geometry['type'], geometry['coordinates']
+    if geometry_type == 'Point':
+        return [np.array([coordinates], dtype = np.float64)[:, :2]]
+    if geometry_type in ('MultiPoint', 'LineString'):
+        return [np.array(coordinates, dtype = np.float64)[:, :2]]
+    if geometry_type in ('MultiLineString', 'Polygon'):
+        return [np.array(part, dtype = np.float64)[:, :2] for part in coordinates]
+    return [np.array(ring, dtype = np.float64)[:, :2] for polygon in coordinates for ring in polygon]
+
+def _geometry_centroid(geometry):
+
+    # the true centroid of a GeoJSON geometry, computed on longitude / latitude like SHAPE@TRUECENTROID of a WGS84 feature class: the mean of the points of a Multipoint,
+    # the length-weighted mean of the segment midpoints of a Polyline, and the area-weighted centroid of the rings of a Polygon (holes taken away).
+    # Degenerate lines and polygons (no length or no area) fall back to the mean of their vertices.
+
+    shape_type = GEOJSON_SHAPE_TYPES[geometry['type']]
+    parts = _geometry_parts(geometry)
+    vertices = np.concatenate(parts)
+
+    if shape_type == 'Polyline':
+        starts = np.concatenate([part[:-1] for part in parts])
+        ends = np.concatenate([part[1:] for part in parts])
+        lengths = np.hypot(*(ends - starts).T)
+        if lengths.sum() > 0:
+            return tuple(((starts + ends) / 2 * lengths[:, None]).sum(axis = 0) / lengths.sum())
+
+    if shape_type == 'Polygon':
+        is_exterior = [ring_idx == 0 for polygon in (geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]) for ring_idx in range(len(polygon))]
+        total_area, moment = 0.0, np.zeros(2)
+        for ring, exterior in zip(parts, is_exterior):
+            x, y = ring[:, 0], ring[:, 1]
+            x_next, y_next = np.roll(x, -1), np.roll(y, -1)
+            cross = x * y_next - x_next * y
+            area = cross.sum() / 2
+            if area == 0:
+                continue
+            ring_centroid = np.array([((x + x_next) * cross).sum(), ((y + y_next) * cross).sum()]) / (6 * area)
+            weight = abs(area) if exterior == True else -abs(area)
+            total_area += weight
+            moment += weight * ring_centroid
+        if total_area != 0:
+            return tuple(moment / total_area)
+
+    return tuple(vertices.mean(axis = 0))
+
+def _geometry_paths(geometry):
+
+    # the vertices of every line or ring of a GeoJSON line or polygon, as a list of (lon, lat) arrays like _read_flight_paths. Rings are closed if they are not already.
+    paths = []
+    for part in _geometry_parts(geometry):
+        if (GEOJSON_SHAPE_TYPES[geometry['type']] == 'Polygon') and (not np.array_equal(part[0], part[-1])):
+            part = np.vstack([part, part[:1]])
+        if len(part) >= 2:
+            paths.append((part[:, 0], part[:, 1]))
+    return paths
+
+### run instrumentation
+
+def _gdb_objects(path_to_gdb):
+
+    # the objects of a file gdb and their size in bytes. Every table or feature class is stored as a group of files sharing one name (a0000000b.gdbtable, a0000000b.gdbtablx, ...).
+    # Returns an empty dict if path_to_gdb is not a folder on disk.
+
+    if not os.path.isdir(path_to_gdb):
+        return {}
+    objects = {}
+    with os.scandir(path_to_gdb) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.startswith('a0'):
+                object_name = entry.name.split('.')[0]
+                objects[object_name] = objects.get(object_name, 0) + entry.stat().st_size
+    return objects
+
+### parallel runs
+
+def _new_run_id():
+
+    # a run_id that is unique across threads, processes and sessions writing to the same gdb. Letters and numbers only, so it is valid in feature class names.
+    import uuid
+    return uuid.uuid4().hex[:16]
+
+def _run_parallel_job(job):
+
+    # runs one rtkMachine in a worker process of rtkMachine.run_parallel. Returns (flight_featureclass, run_id, output_table, error), with error as a traceback string, or None if the job worked.
+    # Workers have no ArcGIS Pro map, and print_output is always False, so nothing is printed (station status changes and centerpoint messages included).
+    # The station catalog cache is per process. Its signature only covers the files of realtime_points, not the outputs other jobs write to the gdb,
+    # so each worker reads the stations once for all of its jobs, unless realtime_points itself changes.
+
+    path_to_gdb, flight_featureclass, run_id, method, machine_kwargs = job
+    machine_kwargs = dict(machine_kwargs, run_id = run_id, use_map = False, print_output = False)
+    try:
+        machine = rtkMachine(path_to_gdb = path_to_gdb, path_to_flight_featureclass = flight_featureclass, **machine_kwargs)
+        getattr(machine, method)()
+        return flight_featureclass, run_id, machine.output_table, None
+    except Exception:
+        return flight_featureclass, run_id, None, traceback.format_exc()
+
+### ArcGIS Pro map adapter
+
+class rtkMapAdapter:
+
+    # the current ArcGIS Pro project and its active map, which are only loaded the first time they are needed (to remove working layers).
+    # Creating an rtkMachine then costs nothing on the map side, and a machine that never touches the map never loads the project.
+
+    def __init__(self) -> None:
+        self._project = None
+        self._active_map = None
+        return
+
+    @property
+    def project(self):
+        if self._project is None:
+            self._project = arcpy.mp.ArcGISProject("CURRENT") # define current project
+        return self._project
+
+    @property
+    def active_map(self):
+        if self._active_map is None:
+            self._active_map = self.project.activeMap # get current map, will be most recently opened map
+        return self._active_map
+
+### scratch workspace
+
+# names of the working objects of the rtkMachine, in this version and in earlier ones, without the suffix they end with: times_already_run (the default run_id),
+# or a run_id from _new_run_id (16 hexadecimal digits). Working objects left in a gdb by runs that failed or were stopped match these exactly (see rtkScratchWorkspace.sweep).
+# Any other suffix (flight_centerpoint_backup, NEAR_points_final, ...) is not a working object, and is never swept. Working objects of runs with a custom run_id aren't swept either.
+SCRATCH_PREFIXES = ['realtime_points_workingcopy', 'realtime_points_status_ok', 'flight_centerpoint', 'flight_centerpoint_near_realtime_ok_table', 'FROM_points', 'NEAR_points', 'combined_NEAR_FROM_points']
+SCRATCH_NAME_PATTERN = re.compile('^(' + '|'.join(SCRATCH_PREFIXES) + r')(\d+|[0-9a-f]{16})$', re.IGNORECASE)
+
+class rtkScratchWorkspace:
+
+    # Where an rtkMachine puts its working objects, and a record of everything it created there, so they can all be removed at once.
+    # The workspace defaults to the memory workspace of ArcGIS Pro, so working objects are never written to the gdb at all. Used as a context manager, the working objects
+    # are removed when the block ends, also when it ends with an exception, so a run that fails partway leaves nothing behind:
+    #
+    #   with rtkScratchWorkspace(path_to_gdb) as scratch:
+    #       arcpy.management.FeatureToPoint(flight, scratch.path('flight_centerpoint1'))
+    #
+    # Layers are removed in one pass over the layers of the map, and objects are deleted with one Delete call. With compact = True the gdb is compacted after every cleanup.
+
+    def __init__(self, path_to_gdb: str = None, workspace: str = 'memory', map_adapter: rtkMapAdapter = None, remove_layers: bool = True, delete_objects: bool = True, compact: bool = False) -> None:
+
+        # path_to_gdb is only needed to compact it, and to sweep it for leftovers. workspace can also be a gdb (path_to_gdb to keep the working objects there, as before).
+        # map_adapter is the rtkMapAdapter whose map the layers are removed from. Without one, layers are not removed.
+        self.path_to_gdb = path_to_gdb
+        self.workspace = workspace
+        self.map = map_adapter
+        self.remove_layers = remove_layers
+        self.delete_objects = delete_objects
+        self.compact = compact
+
+        self.paths = [] # every working object created in the workspace
+        self.layer_names = [] # the names of their layers, which ArcGIS Pro adds to the map
+        self.layers_removed = 0
+        self.objects_deleted = 0
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.cleanup()
+        return False
+
+    def path(self, name):
+
+        # the path for a new working object called name. It is tracked from here on, so it is removed even if the tool creating it fails.
+        path = rf"{self.workspace}\{name}"
+        self.paths.append(path)
+        self.layer_names.append(name)
+        return path
+
+    def remove_tracked_layers(self):
+
+        # removes the layers of the tracked working objects from the map, in one pass over its layers. Layers that are not in the map (anymore) are skipped.
+        # Returns the number of layers removed.
+
+        names = set(self.layer_names)
+        layers = [layer for layer in self.map.active_map.listLayers() if layer.longName in names]
+        for layer in layers:
+            self.map.active_map.removeLayer(layer)
+        self.layer_names = []
+        self.layers_removed += len(layers)
+        return len(layers)
+
+    def delete_tracked_objects(self):
+
+        # deletes the tracked working objects that exist, with one Delete call. Returns the number of objects deleted.
+
+        existing = [path for path in self.paths if arcpy.Exists(path)]
+        if len(existing) > 0:
+            arcpy.management.Delete(existing)
+        self.paths = []
+        self.objects_deleted += len(existing)
+        return len(existing)
+
+    def compact_gdb(self):
+
+        # compacts the gdb, which gets back the space of deleted objects. A file gdb that has had many objects created and deleted gets bigger and slower to open until it is compacted.
+        if self.path_to_gdb is None:
+            raise Exception("path_to_gdb is needed to compact the geodatabase")
+        arcpy.management.Compact(self.path_to_gdb)
+        return
+
+    def cleanup(self):
+
+        # removes the layers and deletes the objects (as set by remove_layers and delete_objects), then compacts the gdb if compact = True
+        if (self.remove_layers == True) and (self.map is not None) and (len(self.layer_names) > 0):
+            self.remove_tracked_layers()
+        if self.delete_objects == True:
+            self.delete_tracked_objects()
+        if (self.compact == True) and (self.path_to_gdb is not None):
+            self.compact_gdb()
+        return
+
+    def sweep(self):
+
+        # deletes working objects left in the gdb by runs that failed or were stopped (earlier versions only deleted them at the end of a run that worked), and removes their layers.
+        # The gdb is listed with one ListFeatureClasses and one ListTables call, and the leftovers are deleted with one Delete call. Returns their names.
+        # Working objects of runs still going match the same names, so only sweep when no other run is using the gdb.
+
+        if self.path_to_gdb is None:
+            raise Exception("path_to_gdb is needed to sweep the geodatabase")
+        previous_workspace = arcpy.env.workspace
+        arcpy.env.workspace = self.path_to_gdb
+        try:
+            names = (arcpy.ListFeatureClasses() or []) + (arcpy.ListTables() or [])
+        finally:
+            arcpy.env.workspace = previous_workspace
+
+        leftovers = [name for name in names if SCRATCH_NAME_PATTERN.match(name) is not None]
+        if len(leftovers) > 0:
+            arcpy.management.Delete([rf"{self.path_to_gdb}\{name}" for name in leftovers])
+            if self.map is not None:
+                self.layer_names = self.layer_names + leftovers
+                self.remove_tracked_layers()
+            self.objects_deleted += len(leftovers)
+        return leftovers
+
 class rtkMachine:
     
     times_already_run = 0 # this will be created when the class is imported, so the class should only be imported once.
@@ -9,19 +1807,41 @@ class rtkMachine:
     # first, initialize the class
     def __init__(self,
                  path_to_gdb: str,
-                 path_to_flight_featureclass: str,
+                 path_to_flight_featureclass: str = None,
                  num_close: int = 1,
                  stations_ok: list = [],
                  stations_unavailable: list = [],
                  draw_lines: bool = True,
                  delete_layers: bool = True,
                  delete_features: bool = True,
-                 display_nearby_points: bool = True
+                 display_nearby_points: bool = True,
+                 print_output: bool = True,
+                 run_id: str = None,
+                 use_map: bool = True,
+                 callbacks: list = [],
+                 profile: bool = False,
+                 result_cache: rtkResultCache = None,
+                 shared_outputs: bool = False,
+                 path_to_realtime: str = None,
+                 flight_geometry = None,
+                 status_feed: rtkStatusRefresher = None,
+                 scratch_workspace: str = 'memory',
+                 compact_gdb: bool = False
         ) -> None: 
 
         # This will keep track of how many times the rtkMachine has been run in one session, so that files are named differently if the machine is run multiple times.
         rtkMachine.times_already_run += 1
 
+        # run_id is added to the end of every output and working name. It defaults to the number of times the rtkMachine has been run in this session.
+        # Runs that can overlap (for example in run_parallel, across processes) are given a collision-free run_id from _new_run_id instead.
+        # So are runs with shared_outputs, whose rows of every session end up in the same Nearby_points and Nearby_lines, where the run_id column is the only way to tell runs apart.
+        if run_id is not None:
+            self.run_id = run_id
+        elif shared_outputs == True:
+            self.run_id = _new_run_id()
+        else:
+            self.run_id = str(rtkMachine.times_already_run)
+
         # Create internal attributes for customization parameters.
         self.num_close = num_close
         self.stations_ok = stations_ok
@@ -29,30 +1849,58 @@ class rtkMachine:
 
         # Create internal attributes for path parameters, including realtime_points within the geodatabase.
         self.path_to_gdb = path_to_gdb
-        self.path_to_realtime = rf"{self.path_to_gdb}\realtime_points"
+        self.path_to_realtime = rf"{self.path_to_gdb}\realtime_points" if (path_to_realtime is None) and (self.path_to_gdb is not None) else path_to_realtime
         self.path_to_flight_featureclass = path_to_flight_featureclass
+
+        # for headless runs (without arcpy), path_to_realtime can be a station snapshot folder, and the flight plans can be given as flight_geometry
+        # (GeoJSON or coordinates, see _read_flight_geometry) instead of a feature class. path_to_gdb is then only needed to draw outputs.
+        self.flight_geometry = flight_geometry
+
+        # optional rtkStatusRefresher. Its feed is refreshed at the start of every run, and its status is used instead of the status in realtime_points (stations_ok and stations_unavailable still apply on top).
+        self.status_feed = status_feed
         
         # Create internal attributes for boolean parameters
         self.delete_layers = delete_layers
         self.delete_features = delete_features
         self.draw_lines = draw_lines
         self.display_nearby_points = display_nearby_points
+        self.print_output = print_output
+
+        # with shared_outputs, every run (and .run_batch) adds its rows to the same Nearby_points and Nearby_lines feature classes, instead of new ones named with the run_id
+        self.shared_outputs = shared_outputs
         
-        self.working_layer_names = [] # every time a working layer is created, append the name string of the layer to this list. They should be removed at the end of .run using _remove_working_layers.
-        self.fc_Delete = [] # same thing but PATH to the feature class gdb. They should be removed at the end of .run (last step, after remove working layers), using _delete_working_layers_from_gdb.
+        # instrumentation. Every stage of a run is timed into .run_report, and each stage's record is passed to every function in callbacks as soon as the stage ends.
+        # With profile = True, the whole run is also profiled with cProfile into .profile_stats.
+        self.callbacks = callbacks
+        self.profile = profile
+
+        # optional rtkResultCache, shared between machines. Centroids found in it skip the station index and the nearest-station query.
+        self.result_cache = result_cache
 
-        self.aprx = arcpy.mp.ArcGISProject("CURRENT") # define current project
-        self.mp = self.aprx.activeMap # get current map, will be most recently opened map
+        # working objects (the centerpoint of .run) are created in scratch_workspace, the memory workspace by default, and tracked by the rtkScratchWorkspace of each run in .scratch.
+        # They are removed at the end of .run even if a stage fails. With compact_gdb, the gdb is compacted after that.
+        self.scratch_workspace = scratch_workspace
+        self.compact_gdb = compact_gdb
+        self.scratch = None
+
+        # use_map = False is for processes outside the ArcGIS Pro application (for example the workers of run_parallel), where there is no "CURRENT" project. Layers are then never removed from a map.
+        # The project and map are only loaded when layers are removed, through the rtkMapAdapter.
+        self.use_map = use_map
+        self.map = rtkMapAdapter() if self.use_map == True else None
 
         return
 
     # method to first check to make sure inputs are OK
-    def _check(self):
+    def _check(self, batch = False):
         
         # checking user input variables
-        if type(self.path_to_gdb) is not str:
+        if (self.path_to_gdb is not None) and (type(self.path_to_gdb) is not str):
             raise Exception("path_to_gdb needs to be a string")
-        if type(self.path_to_flight_featureclass) is not str:
+        if type(self.path_to_realtime) is not str:
+            raise Exception("path_to_realtime needs to be a string. Without path_to_gdb, give the path to the realtime points (or to a station snapshot) as path_to_realtime")
+        if (self.path_to_flight_featureclass is None) == (self.flight_geometry is None):
+            raise Exception("give either path_to_flight_featureclass or flight_geometry, not both")
+        if (self.path_to_flight_featureclass is not None) and (type(self.path_to_flight_featureclass) is not str):
             raise Exception("path_to_flight_featureclass needs to be a string")
         if type(self.num_close) is not int:
             raise Exception("num_close needs to be an integer")
@@ -73,134 +1921,480 @@ class rtkMachine:
             raise Exception("delete_layers needs to be a boolean, True or False")
         if type(self.delete_layers) is not bool:
             raise Exception("delete_features needs to be a boolean, True or False")
+        if type(self.scratch_workspace) is not str:
+            raise Exception("scratch_workspace needs to be a string, 'memory' or the path to a geodatabase")
+        if type(self.compact_gdb) is not bool:
+            raise Exception("compact_gdb needs to be a boolean, True or False")
         if type(self.draw_lines) is not bool:
             raise Exception("draw_lines needs to be a boolean, True or False")
+        if type(self.print_output) is not bool:
+            raise Exception("print_output needs to be a boolean, True or False")
+        if (type(self.run_id) is not str) or (re.fullmatch(r'[A-Za-z0-9_]+', self.run_id) is None):
+            raise Exception("run_id needs to be a string of letters, numbers, and underscores, so it can be used in feature class names")
+        if type(self.use_map) is not bool:
+            raise Exception("use_map needs to be a boolean, True or False")
+        if (type(self.callbacks) is not list) or (not all(callable(callback) for callback in self.callbacks)):
+            raise Exception("callbacks needs to be a list of functions")
+        if type(self.profile) is not bool:
+            raise Exception("profile needs to be a boolean, True or False")
+        if (self.result_cache is not None) and (not isinstance(self.result_cache, rtkResultCache)):
+            raise Exception("result_cache needs to be an rtkResultCache, or None")
+        if type(self.shared_outputs) is not bool:
+            raise Exception("shared_outputs needs to be a boolean, True or False")
+        if (self.status_feed is not None) and (not isinstance(self.status_feed, rtkStatusRefresher)):
+            raise Exception("status_feed needs to be an rtkStatusRefresher, or None")
+        if (self.path_to_gdb is None) and ((batch == False) or (self.shared_outputs == True)) and ((self.draw_lines == True) or (self.display_nearby_points == True)):
+            raise Exception("path_to_gdb is needed to draw lines and nearby points. Set draw_lines and display_nearby_points to False to run without a geodatabase")
             
         # checking the flight feature class itself. It needs to be a Polygon, Polyline, or Point, and needs to contain just one feature.
-        if (arcpy.Describe(rf'{self.path_to_flight_featureclass}').shapeType == 'Polygon') or (arcpy.Describe(rf'{self.path_to_flight_featureclass}').shapeType == 'Polyline'):
-            print('need to get centerpoint')
-        elif arcpy.Describe(rf'{self.path_to_flight_featureclass}').shapeType == 'Point':
-            print('will make a copy of point feature class to use as centerpoint')
+        # In batch mode (.run_batch), Multipoint is also accepted, and the feature class can have any number of features.
+        # flight_geometry is checked the same way, with its GeoJSON types standing in for the shapeType (all of its geometries need to be of one type, like in a feature class).
+        if self.flight_geometry is None:
+            shape_type = arcpy.Describe(rf'{self.path_to_flight_featureclass}').shapeType
+            num_features = int(arcpy.GetCount_management(rf'{self.path_to_flight_featureclass}')[0])
+        else:
+            self.flight_features = _read_flight_geometry(self.flight_geometry)
+            shape_types = {GEOJSON_SHAPE_TYPES[geometry['type']] for fid, geometry in self.flight_features}
+            if len(shape_types) > 1:
+                raise Exception(f"flight_geometry needs to have geometries of one type, like a feature class, not {sorted(shape_types)}")
+            shape_type = shape_types.pop() if len(shape_types) == 1 else None
+            num_features = len(self.flight_features)
+        self.flight_shape_type = shape_type
+
+        if batch == True:
+            if shape_type not in ('Polygon', 'Polyline', 'Point', 'Multipoint'):
+                raise Exception("Feature class shapeType of flight plans needs to be a Polygon, Polyline, Point, or Multipoint for .run_batch. Multipatch not supported.")
+            if num_features < 1:
+                raise Exception("Feature class of flight plans needs to have at least one row (one feature) for .run_batch.")
+            return
+
+        if (shape_type == 'Polygon') or (shape_type == 'Polyline'):
+            if self.print_output == True:
+                print('need to get centerpoint')
+        elif shape_type == 'Point':
+            if self.print_output == True:
+                print('will make a copy of point feature class to use as centerpoint')
         else:
-            raise Exception("Feature class shapeType of flight plan needs to be a Polygon, Polyline, or Point. It should also be a single feature. Multipatch not supported. Multipoint support planned for future update.")
-        if int(arcpy.GetCount_management(rf'{self.path_to_flight_featureclass}')[0]) != 1:
-            raise Exception("Feature class of flight plan needs to have only one row (one feature). If multiple features are relevant, you could merge them as one multipart feature, or split into multiple feature classes. Note that Multipatches are not supported. Multipoint is not supported either, but planned to be implemented in a future update.")
+            raise Exception("Feature class shapeType of flight plan needs to be a Polygon, Polyline, or Point. It should also be a single feature. Multipatch not supported. For Multipoint, use .run_batch.")
+        if num_features != 1:
+            raise Exception("Feature class of flight plan needs to have only one row (one feature). If multiple features are relevant, you could merge them as one multipart feature, use .run_batch to evaluate every feature in one run, or split into multiple feature classes. Note that Multipatches are not supported.")
             
     # method to make it work is .run
     def run(self):
 
-        # check parameters
-        self._check()
+        self._start_report()
+        self.scratch = rtkScratchWorkspace(self.path_to_gdb, workspace = self.scratch_workspace, map_adapter = self.map, remove_layers = self.delete_layers, delete_objects = self.delete_features, compact = self.compact_gdb)
+        try:
+            # check parameters
+            self._run_stage(self._check)
+
+            # run defined internal methods, according to user input. All defined below.
+            self._run_stage(self._modify_realtime_points)
+            if (self.flight_geometry is None) and (self.path_to_gdb is not None):
+                self._run_stage(self._get_center_point)
+            else:
+                # with flight_geometry, or no geodatabase, the centroid is computed straight from the flight plan instead of a centerpoint feature class
+                self._run_stage(self._read_flight_centroids)
+            # the result cache only decides whether the station index is needed, never where the centroid comes from, so it can't change the result.
+            # With a result cache, the station index is only built if the centroid is not cached.
+            if self.result_cache is not None:
+                self._run_stage(self._lookup_result_cache)
+            if (self.result_cache is None) or self.cache_misses.any():
+                self._run_stage(self._get_usable_realtime_points)
+            self._run_stage(self._generate_near_table)
+            self._run_stage(self._get_output_stats)
+
+            if self.draw_lines == True:
+                self._run_stage(self._write_nearby_lines)
+            if self.display_nearby_points == True:
+                self._run_stage(self._write_nearby_points)
+        finally:
+            # the working objects are cleaned up even if a stage failed. The map is only loaded if there are working layers to remove.
+            try:
+                if (self.delete_layers == True) and (self.use_map == True) and (len(self.scratch.layer_names) > 0):
+                    self._run_stage(self._remove_working_layers)
+                if self.delete_features == True:
+                    self._run_stage(self._delete_working_layers_from_gdb)
+                if (self.compact_gdb == True) and (self.path_to_gdb is not None):
+                    self._run_stage(self._compact_gdb)
+            finally:
+                self._finish_report()
+        return
+
+    # batch version of .run. Every feature of the flight feature class is evaluated in one run, instead of splitting plans into single-feature classes and running .run once per class.
+    def run_batch(self):
+
+        self._start_report()
+        try:
+            # check parameters, allowing any number of features
+            self._run_stage(self._check, batch = True)
+
+            # the realtime points are prepared once for all flight features
+            self._run_stage(self._modify_realtime_points)
+
+            # centroids of all features are read in one pass, then one N x num_close query is made for all of them (only for the ones not in the result cache, if there is one)
+            self._run_stage(self._read_flight_centroids)
+            if self.result_cache is not None:
+                self._run_stage(self._lookup_result_cache)
+            if (self.result_cache is None) or self.cache_misses.any():
+                self._run_stage(self._get_usable_realtime_points)
+            self._run_stage(self._generate_near_table)
+            self._run_stage(self._get_output_stats, batch = True)
+
+            # by default nothing is drawn in batch mode. With shared_outputs = True, the lines and points of every flight feature are added to Nearby_lines and Nearby_points.
+            # The realtime points are handled in memory, so there is nothing to clean up.
+            if (self.shared_outputs == True) and (self.draw_lines == True):
+                self._run_stage(self._write_nearby_lines)
+            if (self.shared_outputs == True) and (self.display_nearby_points == True):
+                self._run_stage(self._write_nearby_points)
+        finally:
+            self._finish_report()
+        return
 
-        # run defined internal methods, according to user input. All defined below.
-        self._modify_realtime_points()
-        self._get_usable_realtime_points()
-        self._get_center_point()
-        self._generate_near_table()
+    # runs many flight feature classes at once, spread over a pool of worker processes. Every job gets a collision-free run_id, and errors are kept per job, so one bad flight plan does not stop the others.
+    # This needs to be called from a standalone script that imports this file (for example with the ArcGIS Pro python environment's propy.bat), because the worker processes import it by name;
+    # it does not work from code loaded into the ArcGIS Pro python window, and raises a RuntimeError there.
+    @classmethod
+    def run_parallel(cls, path_to_gdb, flight_featureclasses, max_workers = None, method = 'run_batch', **machine_kwargs):
+
+        # method is 'run_batch' (compute only, works for any number of features per class) or 'run' (also draws the outputs of each class in the gdb, with the run_id in their names).
+        # machine_kwargs are passed on to every rtkMachine, for example num_close or stations_ok.
+        # Returns (combined output table, errors). The combined table has the flight_featureclass and run_id of every row in front of the usual .output_table columns.
+        # errors has one row per failed job, with its traceback.
+
+        if method not in ('run_batch', 'run'):
+            raise Exception("method needs to be 'run_batch' or 'run'")
+        if type(flight_featureclasses) is not list:
+            raise Exception("flight_featureclasses needs to be a list of paths to flight feature classes")
+        if machine_kwargs.get('shared_outputs') == True:
+            raise Exception("worker processes cannot write into the same feature classes at once. Run without shared_outputs, or loop over .run_batch with shared_outputs = True instead")
+
+        # inside ArcGIS Pro, sys.executable is the application itself, so worker processes would start new copies of ArcGIS Pro instead of python
+        if os.path.basename(sys.executable).lower() == 'arcgispro.exe':
+            raise RuntimeError("run_parallel does not work from the ArcGIS Pro python window. Call it from a standalone script that imports rtkMachine_v1 (for example with propy.bat), or use .run_batch in the python window instead")
+
+        from concurrent.futures import ProcessPoolExecutor
+        jobs = [(path_to_gdb, flight_featureclass, _new_run_id(), method, machine_kwargs) for flight_featureclass in flight_featureclasses]
+
+        tables, errors = [], []
+        with ProcessPoolExecutor(max_workers = max_workers) as executor:
+            for flight_featureclass, run_id, output_table, error in executor.map(_run_parallel_job, jobs):
+                if error is None:
+                    output_table.insert(loc = 0, column = 'flight_featureclass', value = flight_featureclass)
+                    output_table.insert(loc = 1, column = 'run_id', value = run_id)
+                    tables.append(output_table)
+                else:
+                    errors.append({'flight_featureclass': flight_featureclass, 'run_id': run_id, 'error': error})
+
+        combined_table = pd.concat(tables, ignore_index = True) if len(tables) > 0 else pd.DataFrame()
+        errors = pd.DataFrame(errors, columns = ['flight_featureclass', 'run_id', 'error'])
+        return combined_table, errors
+
+    # along-track version of .run for Polyline and Polygon flight plans. Instead of only the centroid, the whole track (or polygon outline) is densified and streamed through the station index in chunks.
+    def run_along_track(self, spacing_meters = 100.0, chunk_size = 10000):
+
+        self._start_report()
+        try:
+            # check parameters. spacing_meters is the largest distance between densified points, chunk_size the most points held in memory at once.
+            self._run_stage(self._check)
+            if self.flight_shape_type not in ('Polyline', 'Polygon'):
+                raise Exception("run_along_track needs a Polyline or Polygon flight feature class. For a Point, use .run")
+            if (type(spacing_meters) not in (int, float)) or (spacing_meters <= 0):
+                raise Exception("spacing_meters needs to be a positive number")
+            if (type(chunk_size) is not int) or (chunk_size < 1):
+                raise Exception("chunk_size needs to be a positive integer")
+
+            self._run_stage(self._modify_realtime_points)
+            self._run_stage(self._get_usable_realtime_points)
+            self._run_stage(self._read_flight_paths)
+            self._run_stage(self._get_along_track_stats, spacing_meters, chunk_size)
+        finally:
+            self._finish_report()
+        return
 
-        if self.draw_lines == True:
-            self._create_FROM_points()
-            self._create_NEAR_points()
-            self._combine_NEAR_and_FROM_points()
-            self._create_near_lines()
+    def _get_along_track_stats(self, spacing_meters, chunk_size):
 
-        self._get_output_stats()
+        # streams the flight paths through the station index (see _along_track_coverage), and creates the .along_track_table and .along_track_worst attributes
 
-        if self.display_nearby_points == True:
-            self._get_nearby_points()
+        self.along_track_table = _along_track_coverage(self.flight_paths, self.station_index, spacing_meters = spacing_meters, chunk_size = chunk_size)
+        self.along_track_table.insert(loc = 12, column = 'worst_pnum', value = self.realtime_table.set_index('OBJECTID')['pnum'].reindex(self.along_track_table['worst_NEAR_FID']).to_numpy())
+        self.along_track_worst = self.along_track_table.loc[self.along_track_table['max_distance_meters'].idxmax()]
 
-        if self.delete_layers == True:
-            self._remove_working_layers()
-        if self.delete_features == True:
-            self._delete_working_layers_from_gdb()
+        if self.print_output == True:
+            worst = self.along_track_worst
+            print('\n')
+            print(f"Checked {int(self.along_track_table['num_points'].sum())} points along {len(self.along_track_table)} segments, at most {spacing_meters} meters apart.")
+            print(f"The worst point is on segment {int(worst['segment'])} of part {int(worst['part'])}, {round(worst['max_distance_meters'], 2)} meters from its nearest base station {worst['worst_pnum']}.")
+            print(f"Estimated Horizontal Error there: {worst['horizontal_error_est_max']} milimeters. Estimated Vertical Error there: {worst['vertical_error_est_max']} milimeters.")
+            print('Information for every segment accessible through .along_track_table object attribute, and for the worst segment through .along_track_worst.')
         return
 
-    def _modify_realtime_points(self): 
+    # footprint version of .run for Polyline and Polygon flight plans. The distance to each station is evaluated over the whole footprint (every vertex, and a grid inside polygons)
+    # instead of at the centroid alone, and the num_close stations with the smallest worst-case distance are chosen for every flight feature. Works on all features, like .run_batch.
+    def run_footprint(self, num_samples = 2000, percentile = 95, chunk_size = 1000000):
+
+        self._start_report()
+        try:
+            # check parameters. num_samples is about how many points the mean and percentile are computed over, percentile which percentile of the distance to report,
+            # and chunk_size the most station-vertex pairs held in memory at once.
+            self._run_stage(self._check, batch = True)
+            if self.flight_shape_type not in ('Polyline', 'Polygon'):
+                raise Exception("run_footprint needs a Polyline or Polygon flight feature class. For a Point, use .run")
+            if (type(num_samples) is not int) or (num_samples < 1):
+                raise Exception("num_samples needs to be a positive integer")
+            if (type(percentile) not in (int, float)) or (percentile < 0) or (percentile > 100):
+                raise Exception("percentile needs to be a number from 0 to 100")
+            if (type(chunk_size) is not int) or (chunk_size < 1):
+                raise Exception("chunk_size needs to be a positive integer")
+
+            self._run_stage(self._modify_realtime_points)
+            self._run_stage(self._get_usable_realtime_points)
+            self._run_stage(self._read_flight_centroids)
+            self._run_stage(self._read_flight_paths)
+            self._run_stage(self._get_footprint_stats, num_samples, percentile, chunk_size)
+        finally:
+            self._finish_report()
+        return
 
-        # Creates a copy of the realtime points in the gdb, then modifies this copy's 'status' field according to user input.
+    def _get_footprint_stats(self, num_samples, percentile, chunk_size):
+
+        # evaluates the footprint of every flight feature (see _footprint_coverage), and creates the .footprint_table attribute:
+        # one row per flight feature and chosen station, with the station attributes, the distance from the centroid (what .run would use) and the footprint statistics.
+
+        tables = []
+        self.footprint_candidates = {}
+        for fid, center_lon, center_lat in zip(self.center_fids.tolist(), self.center_lon.tolist(), self.center_lat.tolist()):
+            paths = [path for path, path_fid in zip(self.flight_paths, self.flight_path_fids) if path_fid == fid]
+            if len(paths) == 0:
+                continue
+            table, self.footprint_candidates[fid] = _footprint_coverage(paths, self.flight_shape_type, self.station_index, k = self.num_close,
+                                                                       num_samples = num_samples, percentile = percentile, chunk_size = chunk_size)
+            centroid_distance, _ = _geodesic_inverse(self.station_index.lon[table['position']], self.station_index.lat[table['position']], center_lon, center_lat)
+            table.insert(loc = 0, column = 'flight_OID', value = fid)
+            table.insert(loc = 1, column = 'NEAR_RANK', value = np.arange(1, len(table) + 1))
+            table.insert(loc = 4, column = 'centroid_distance_meters', value = centroid_distance)
+            tables.append(table)
+        if len(tables) == 0:
+            raise Exception("The flight features have no vertices to evaluate")
+        table = pd.concat(tables, ignore_index = True)
+
+        stations = self.realtime_table.take(table['position'].to_numpy()).reset_index(drop = True)
+        self.footprint_table = pd.concat([table[['flight_OID', 'NEAR_RANK']], stations[self.realtime_field_names], table.drop(columns = ['flight_OID', 'NEAR_RANK', 'position', 'NEAR_FID'])], axis = 1)
+
+        if self.print_output == True:
+            percentile_column = f'p{percentile:g}_distance_meters'
+            for _, row in self.footprint_table.iterrows():
+                print('\n')
+                print(f"For flight feature {row['flight_OID']}, the base station by a rank of {int(row['NEAR_RANK'])} is {row['pnum']}, {round(row['max_distance_meters'], 2)} meters away at worst "
+                      f"(mean {round(row['mean_distance_meters'], 2)}, p{percentile:g} {round(row[percentile_column], 2)}, centroid {round(row['centroid_distance_meters'], 2)} meters).")
+                print(f"Estimated Horizontal Error at worst: {round(row['horizontal_error_est_max'], 2)} milimeters. Estimated Vertical Error at worst: {round(row['vertical_error_est_max'], 2)} milimeters.")
+            print('\n')
+            print('Information for all flight features and stations accessible through .footprint_table object attribute.')
+        return
 
-        # The string of the output for copy_features, within the gdb, and named at the end with the number of times the rtkMachine has run. This pattern will repeat throughout.
-        out_class_string = rf"{self.path_to_gdb}\realtime_points_workingcopy{rtkMachine.times_already_run}"
+    # network RTK version of .run_batch. Instead of adding 1 ppm of the distance to the nearest base station, the errors are estimated from the triangle of usable stations
+    # around the centroid of every flight feature (see rtkStationTriangulation). Centroids outside the network get the single-base estimate of their nearest station.
+    def run_network(self):
+
+        self._start_report()
+        try:
+            self._run_stage(self._check, batch = True)
+            self._run_stage(self._modify_realtime_points)
+            self._run_stage(self._get_usable_realtime_points)
+            self._run_stage(self._read_flight_centroids)
+            self._run_stage(self._get_network_stats)
+        finally:
+            self._finish_report()
+        return
 
-        # make the copied realtime points, to be modified
-        arcpy.management.CopyFeatures(
-            in_features=self.path_to_realtime,
-            out_feature_class=out_class_string,
-            config_keyword="",
-            spatial_grid_1=None,
-            spatial_grid_2=None,
-            spatial_grid_3=None
-        )
-        
-        # for each list (so this will basically be twice)
-            # get indices
-            # modify status values based on these indices
+    def _get_network_stats(self):
+
+        # creates the .triangulation and .network_table attributes. A triangulation attached to the status_feed is reused if it follows the same station index, since it is already
+        # up to date with the feed. Otherwise the usable stations are triangulated here.
+
+        self.triangulation = None
+        if self.status_feed is not None:
+            for structure in self.status_feed.structures:
+                if isinstance(structure, rtkStationTriangulation) and (structure.station_index is self.station_index):
+                    self.triangulation = structure
+        if self.triangulation is None:
+            self.triangulation = rtkStationTriangulation(self.station_index)
+
+        network = self.triangulation.network_table(self.center_lon, self.center_lat, in_fids = self.center_fids)
+        pnum_of_fid = self.realtime_table.set_index('OBJECTID')['pnum']
+        self.network_table = pd.DataFrame({'flight_OID': network['IN_FID'], 'in_network': network['in_network']})
+        for corner in range(1, 4):
+            self.network_table[f'pnum_{corner}'] = pnum_of_fid.reindex(network[f'NEAR_FID_{corner}']).to_numpy()
+        for corner in range(1, 4):
+            self.network_table[f'distance_meters_{corner}'] = network[f'NEAR_DIST_{corner}']
+        for corner in range(1, 4):
+            self.network_table[f'weight_{corner}'] = network[f'WEIGHT_{corner}']
+        self.network_table[['network_distance_meters', 'horizontal_error_est', 'vertical_error_est']] = network[['network_distance_meters', 'horizontal_error_est', 'vertical_error_est']]
+
+        if self.print_output == True:
+            print('\n')
+            if len(self.network_table) == 1:
+                row = self.network_table.iloc[0]
+                if row['in_network'] == True:
+                    print(f"The flight feature is inside the network triangle of {row['pnum_1']}, {row['pnum_2']} and {row['pnum_3']}, at an interpolated distance of {round(row['network_distance_meters'], 2)} meters.")
+                else:
+                    print(f"The flight feature is outside the station network. The nearest base station is {row['pnum_1']} at a distance of {round(row['network_distance_meters'], 2)} meters.")
+                print(f"Estimated Horizontal Error: {round(row['horizontal_error_est'], 2)} milimeters. Estimated Vertical Error: {round(row['vertical_error_est'], 2)} milimeters.")
+            else:
+                print(f"Evaluated {len(self.network_table)} flight features, {int(self.network_table['in_network'].sum())} of them inside the station network.")
+            print('Information for all flight features accessible through .network_table object attribute.')
+        return
 
-        counter = 0 # for keeping track of the index
-        fc = out_class_string # feature class we will be iterating through and modifying
-        field = ['pnum'] # field of the names of the stations
-        list_of_names = [] # will get all the names of all the stations
+    def _read_flight_paths(self):
 
-        # this will get us all the names of stations in og data
-        with arcpy.da.UpdateCursor(fc,field) as cursor:
+        # reads the vertices of every part of the flight feature class in WGS84, as a list of (lon, lat) arrays. Polygon rings are already closed (the first vertex is repeated at the end).
+        # Within a polygon part, arcpy separates the rings with None. With flight_geometry, the lines and rings of its geometries are used instead.
+
+        # .flight_path_fids holds the flight feature ID of every path.
+
+        if self.flight_geometry is not None:
+            fid_paths = [(fid, path) for fid, geometry in self.flight_features for path in _geometry_paths(geometry)]
+            self.flight_path_fids = [fid for fid, path in fid_paths]
+            self.flight_paths = [path for fid, path in fid_paths]
+            return
+
+        wgs84 = arcpy.SpatialReference(4326)
+        fid_rings = []
+        with arcpy.da.SearchCursor(self.path_to_flight_featureclass, ['OID@', 'SHAPE@'], spatial_reference = wgs84) as cursor:
             for row in cursor:
-                counter += 1
-                list_of_names.append(row[0])        
+                for part in row[1]:
+                    ring = []
+                    for point in part:
+                        if point is None:
+                            fid_rings.append((row[0], ring))
+                            ring = []
+                        else:
+                            ring.append((point.X, point.Y))
+                    fid_rings.append((row[0], ring))
+
+        fid_rings = [(fid, ring) for fid, ring in fid_rings if len(ring) >= 2]
+        self.flight_path_fids = [fid for fid, ring in fid_rings]
+        self.flight_paths = [(np.array([xy[0] for xy in ring]), np.array([xy[1] for xy in ring])) for fid, ring in fid_rings]
+        return
 
-        # get the indexes of things we want to be changed, one way or another
-        idxs_to_ok = []
-        for item in self.stations_ok:
-            idx_of_item = [idx for idx in range(len(list_of_names)) if list_of_names[idx] == item][0]
-            idxs_to_ok.append(idx_of_item)
+    # The following three methods are the instrumentation of a run. Every stage is called through _run_stage, which records its wall time, the rows it processed,
+    # and the count and bytes of gdb objects it created and deleted (found by comparing the files of the gdb folder before and after the stage).
+
+    # how many rows each stage processed, read from what the stage leaves on the instance
+    _stage_rows = {
+        '_modify_realtime_points': lambda self: len(self.realtime_table),
+        '_get_usable_realtime_points': lambda self: int(self.usable_mask.sum()),
+        '_get_center_point': lambda self: len(self.center_fids),
+        '_read_flight_centroids': lambda self: len(self.center_fids),
+        '_read_flight_paths': lambda self: sum(len(path_lon) for path_lon, _ in self.flight_paths),
+        '_lookup_result_cache': lambda self: int((~self.cache_misses).sum()),
+        '_generate_near_table': lambda self: len(self.near_table),
+        '_get_output_stats': lambda self: len(self.output_table),
+        '_write_nearby_lines': lambda self: len(self.near_table),
+        '_write_nearby_points': lambda self: len(self.near_table),
+        '_get_along_track_stats': lambda self: int(self.along_track_table['num_points'].sum()),
+        '_get_footprint_stats': lambda self: len(self.footprint_table),
+        '_get_network_stats': lambda self: len(self.network_table),
+        '_remove_working_layers': lambda self: self.scratch.layers_removed,
+        '_delete_working_layers_from_gdb': lambda self: self.scratch.objects_deleted
+    }
+
+    def _start_report(self):
+
+        self.run_report_records = []
+        self.profiler = None
+        if self.profile == True:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return
 
-        idxs_to_unavailable = []
-        for item in self.stations_unavailable:
-            idx_of_item = [idx for idx in range(len(list_of_names)) if list_of_names[idx] == item][0]
-            idxs_to_unavailable.append(idx_of_item)
+    def _run_stage(self, stage, *args, **kwargs):
+
+        # calls stage(*args, **kwargs) and records it. If the stage raises, its record is still made (with error set) before the exception continues.
+
+        objects_before = _gdb_objects(self.path_to_gdb) if type(self.path_to_gdb) is str else {}
+        error = None
+        start = time.perf_counter()
+        try:
+            return stage(*args, **kwargs)
+        except Exception as exception:
+            error = repr(exception)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            objects_after = _gdb_objects(self.path_to_gdb) if type(self.path_to_gdb) is str else {}
+            created = [name for name in objects_after if name not in objects_before]
+            deleted = [name for name in objects_before if name not in objects_after]
+
+            rows = np.nan
+            if (error is None) and (stage.__name__ in rtkMachine._stage_rows):
+                rows = rtkMachine._stage_rows[stage.__name__](self)
+
+            record = {
+                'stage': stage.__name__,
+                'seconds': seconds,
+                'rows': rows,
+                'gdb_objects_created': len(created),
+                'gdb_bytes_created': sum(objects_after[name] for name in created),
+                'gdb_objects_deleted': len(deleted),
+                'gdb_bytes_deleted': sum(objects_before[name] for name in deleted),
+                'error': error
+            }
+            self.run_report_records.append(record)
+            for callback in (self.callbacks if type(self.callbacks) is list else []):
+                callback(record)
+
+    def _finish_report(self):
+
+        # creates the .run_report attribute (one row per stage, in order) and, when profiling, the .profile_stats attribute (a pstats.Stats, for example .profile_stats.sort_stats('cumulative').print_stats(20))
+
+        if self.profiler is not None:
+            import pstats
+            self.profiler.disable()
+            self.profile_stats = pstats.Stats(self.profiler)
+        self.run_report = pd.DataFrame(self.run_report_records, columns = ['stage', 'seconds', 'rows', 'gdb_objects_created', 'gdb_bytes_created', 'gdb_objects_deleted', 'gdb_bytes_deleted', 'error'])
+        return
 
+    def _modify_realtime_points(self): 
 
-        # for each list (so this will basically be twice)
-            # modify status values based on these indices
-        
-        fc = out_class_string
-        field = ['status']
-        
-        counter = 0
-        with arcpy.da.UpdateCursor(fc,field) as cursor:
-            for row in cursor:
-                if counter in idxs_to_ok:
-                    print(f'changing row index {counter} to OK')
-                    row[0] = 'OK'
-                    cursor.updateRow(row)
-                counter += 1
-
-        counter = 0
-        with arcpy.da.UpdateCursor(fc,field) as cursor:
-            for row in cursor:
-                if counter in idxs_to_unavailable:
-                    print(f'changing row index {counter} to Status Unavailable')
-                    row[0] = 'Status Unavailable'
-                    cursor.updateRow(row)
-                counter += 1
-
-        self.modified_realtime = out_class_string
-        self.working_layer_names.append(f'realtime_points_workingcopy{rtkMachine.times_already_run}')
-        self.fc_Delete.append(out_class_string)
+        # Gets the realtime points from the session-wide station catalog (read from the gdb only the first time, or when it changed), then modifies an in-memory copy of the 'status' column according to user input.
+        # The realtime_points feature class in the gdb is only read, never copied or modified. With a status_feed, its refreshed status is the starting point instead of the status in realtime_points.
+
+        self.catalog = rtkStationCatalog.load(self.path_to_realtime)
+        self.realtime_field_names = list(self.catalog.field_names)
+        self.realtime_table = self.catalog.to_frame()
+        self.realtime_lon = self.catalog.lon
+        self.realtime_lat = self.catalog.lat
+
+        if self.status_feed is not None:
+            if self.status_feed.catalog is not self.catalog:
+                raise Exception("status_feed was made for another station catalog (the realtime points have changed since). Make a new rtkStatusRefresher with rtkStationCatalog.load(path_to_realtime).")
+            changes = self.status_feed.refresh()
+            if (self.print_output == True) and (len(changes) > 0):
+                print(f"status feed: {len(changes)} stations changed status ({', '.join(changes['pnum'].head(10))}{', ...' if len(changes) > 10 else ''})")
+            self.realtime_table['status'] = self.status_feed.status
+
+        # apply stations_ok, then stations_unavailable, so a station in both lists ends up unavailable (same order as before)
+        self.realtime_table['status'] = _apply_status_overrides(
+            pnum = self.realtime_table['pnum'].to_numpy(),
+            status = self.realtime_table['status'].to_numpy(),
+            stations_ok = self.stations_ok,
+            stations_unavailable = self.stations_unavailable,
+            print_changes = self.print_output
+        )
         return 
 
     def _get_usable_realtime_points(self):
 
-        # create second copy of realtime points where the status is OK
+        # the usable realtime points are the ones where the status is OK, kept as a boolean mask over the in-memory realtime points instead of a second copy in the gdb.
+        # With a status_feed and no stations_ok / stations_unavailable, the feed's own station index is used as it is, since it already follows the feed change by change.
 
-        self.usable_realtime = rf"{self.path_to_gdb}\realtime_points_status_ok{rtkMachine.times_already_run}"
-
-        input_fc = self.modified_realtime
-        output_fc = self.usable_realtime
-
-        arcpy.Select_analysis(input_fc, output_fc, where_clause="status = 'OK'")
-        
-        self.working_layer_names.append(rf'realtime_points_status_ok{rtkMachine.times_already_run}')
-        self.fc_Delete.append(self.usable_realtime)
+        if (self.status_feed is not None) and (len(self.stations_ok) == 0) and (len(self.stations_unavailable) == 0):
+            self.station_index = self.status_feed.station_index
+        else:
+            self.station_index = self.catalog.station_index(status = self.realtime_table['status'].to_numpy())
+        self.usable_mask = self.station_index.active
 
         return
 
@@ -208,7 +2402,7 @@ class rtkMachine:
 
         # To calculate distances and draw nearby features, the centerpoint (CENTROID) of the feature is used. If the feature is already a point, that is used.
 
-        self.centerpoint_path = rf"{self.path_to_gdb}\flight_centerpoint{rtkMachine.times_already_run}"
+        self.centerpoint_path = self.scratch.path(rf"flight_centerpoint{self.run_id}")
 
         if (arcpy.Describe(rf'{self.path_to_flight_featureclass}').shapeType == 'Polygon') or (arcpy.Describe(rf'{self.path_to_flight_featureclass}').shapeType == 'Polyline'):
             arcpy.management.FeatureToPoint(
@@ -225,256 +2419,178 @@ class rtkMachine:
                 spatial_grid_2=None,
                 spatial_grid_3=None
             )
-        self.working_layer_names.append(rf"flight_centerpoint{rtkMachine.times_already_run}")
-        self.fc_Delete.append(self.centerpoint_path)
 
+        self._read_center_points(self.centerpoint_path)
         return
 
-    def _generate_near_table(self):
+    def _read_center_points(self, path_to_points):
 
-        # This method generates the near table which is then referenced for XY coordinates of nearby rtk points.
+        # reads the centroid of every feature in path_to_points, in WGS84, with one FeatureClassToNumPyArray call.
+        # SHAPE@TRUECENTROID is the true centroid (center of gravity) of polygons, polylines and multipoints, the same point FeatureToPoint CENTROID makes, and the point itself for points.
+        # SHAPE@XY is not used, because for a concave polygon or a curved line whose true centroid is outside the feature it is the label point instead.
 
-        self.near_table_path = rf"{self.path_to_gdb}\flight_centerpoint_near_realtime_ok_table{rtkMachine.times_already_run}"
-        arcpy.analysis.GenerateNearTable(
-            in_features=rf"flight_centerpoint{rtkMachine.times_already_run}",
-            near_features=self.usable_realtime,
-            out_table=self.near_table_path,
-            search_radius=None,
-            location="LOCATION",
-            angle="ANGLE",
-            closest="ALL",
-            closest_count=self.num_close,
-            method="GEODESIC",
-            distance_unit="Meters"
-        )
-        return
+        wgs84 = arcpy.SpatialReference(4326)
+        centerpoint_np = arcpy.da.FeatureClassToNumPyArray(in_table = path_to_points, field_names = ["OID@", "SHAPE@TRUECENTROID"], spatial_reference = wgs84)
 
-    # The following four methods, _create_FROM_points, _create_NEAR_points, _combine_NEAR_and_FROM_points, and _create_near_lines reference the near table that is generated before,
-    # get the coordinates of points used to draw lines
-    # then draw the lines based on the common field of the FID of the rtk point they are near.
-        
-    def _create_FROM_points(self):
-
-        self.FROM_points_path = rf"{self.path_to_gdb}\FROM_points{rtkMachine.times_already_run}"
-        arcpy.management.XYTableToPoint(
-            in_table=self.near_table_path,
-            out_feature_class=self.FROM_points_path,
-            x_field="FROM_X",
-            y_field="FROM_Y",
-            z_field=None,
-            coordinate_system=''
-        )
-        self.working_layer_names.append(rf"FROM_points{rtkMachine.times_already_run}")
-        self.fc_Delete.append(self.FROM_points_path)
+        self.center_fids = centerpoint_np["OID@"]
+        self.center_lon = centerpoint_np["SHAPE@TRUECENTROID"][:, 0].copy()
+        self.center_lat = centerpoint_np["SHAPE@TRUECENTROID"][:, 1].copy()
         return
 
-    def _create_NEAR_points(self):
+    def _read_flight_centroids(self):
 
-        # NOTE that this method is different from _get_nearby_points. The output of this method does NOT have the relevant information. 
-        #The _get_nearby_points method outputs the relevant points WITH information.
+        # the centroid of every flight feature, read from the flight feature class (see _read_center_points), or computed from flight_geometry (see _geometry_centroid)
 
-        self.NEAR_points_path = rf"{self.path_to_gdb}\NEAR_points{rtkMachine.times_already_run}"
-        arcpy.management.XYTableToPoint(
-            in_table=self.near_table_path,
-            out_feature_class=self.NEAR_points_path,
-            x_field="NEAR_X",
-            y_field="NEAR_Y",
-            z_field=None,
-            coordinate_system=''
-        )
-        self.working_layer_names.append(rf"NEAR_points{rtkMachine.times_already_run}")
-        self.fc_Delete.append(self.NEAR_points_path)
-        
-        return
+        if self.flight_geometry is None:
+            self._read_center_points(self.path_to_flight_featureclass)
+            return
 
-    def _combine_NEAR_and_FROM_points(self):
-        self.combined_points_path = rf"{self.path_to_gdb}\combined_NEAR_FROM_points{rtkMachine.times_already_run}"
-        arcpy.management.Merge(
-            inputs=rf"{self.FROM_points_path};{self.NEAR_points_path}",
-            output=self.combined_points_path,
-            field_mappings=None,
-            add_source="NO_SOURCE_INFO",
-            field_match_mode="USE_FIRST_SCHEMA"
-        )
-        self.working_layer_names.append(rf"combined_NEAR_FROM_points{rtkMachine.times_already_run}")
-        self.fc_Delete.append(self.combined_points_path)
+        centroids = np.array([_geometry_centroid(geometry) for fid, geometry in self.flight_features], dtype = np.float64).reshape(-1, 2)
+        self.center_fids = np.array([fid for fid, geometry in self.flight_features])
+        self.center_lon = centroids[:, 0]
+        self.center_lat = centroids[:, 1]
+        return
 
-    def _create_near_lines(self):
+    def _generate_near_table(self):
 
-        # This method draws the nearby lines. This is purely visual as they do not contain the relevant information. 
-        # Note that, like _get_nearby_points, the name of the output layer and the path to the feature class location in the gdb are not added to the list to be removed / deleted
-        
-        self.near_lines_path = rf"{self.path_to_gdb}\Nearby_lines{rtkMachine.times_already_run}"
-        arcpy.management.PointsToLine(
-            Input_Features=self.combined_points_path,
-            Output_Feature_Class=self.near_lines_path,
-            Line_Field="NEAR_FID",
-            Sort_Field=None,
-            Close_Line="NO_CLOSE",
-            Line_Construction_Method="TWO_POINT",
-            Attribute_Source="NONE",
-            Transfer_Fields=None
-        )
+        # This method generates the near table which is then referenced for XY coordinates of nearby rtk points.
+        # The near table is computed in memory by rtkStationIndex (geodesic, like GenerateNearTable with method="GEODESIC"), so nothing is written to the gdb here.
+        # Only stations in .usable_mask (status OK) can be returned.
+
+        if self.result_cache is None:
+            self.near_table = self.station_index.near_table(lon = self.center_lon, lat = self.center_lat, k = self.num_close, in_fids = self.center_fids)
+            return
+
+        # with a result cache, only the centroids that were not found in it are queried, and their rows are added to it. Cached rows are from a centroid within
+        # tolerance_degrees of this one, so their NEAR_DIST can differ from an exact query by about that much.
+        if self.cache_misses.any():
+            misses = np.flatnonzero(self.cache_misses)
+            missed_table = self.station_index.near_table(lon = self.center_lon[misses], lat = self.center_lat[misses], k = self.num_close, in_fids = self.center_fids[misses])
+            # k is clipped to the number of usable stations, so there can be fewer than num_close rows per centroid
+            k = len(missed_table) // len(misses)
+            missed_rows = missed_table[RESULT_CACHE_COLUMNS].to_records(index = False).reshape(len(misses), k)
+            for position, rows in zip(misses, missed_rows):
+                self.cached_near[position] = rows.copy()
+                self.result_cache.put(self.cache_keys[position], self.cached_near[position])
+            if self.result_cache.path is not None:
+                self.result_cache.save()
+
+        rows = np.concatenate(self.cached_near)
+        rows_per_centroid = [len(centroid_rows) for centroid_rows in self.cached_near]
+        self.near_table = pd.DataFrame({
+            'OBJECTID': np.arange(1, len(rows) + 1),
+            'IN_FID': np.repeat(self.center_fids, rows_per_centroid),
+            'NEAR_FID': rows['NEAR_FID'],
+            'NEAR_DIST': rows['NEAR_DIST'],
+            'FROM_X': np.repeat(self.center_lon, rows_per_centroid),
+            'FROM_Y': np.repeat(self.center_lat, rows_per_centroid),
+            'NEAR_X': rows['NEAR_X'],
+            'NEAR_Y': rows['NEAR_Y'],
+            'NEAR_ANGLE': rows['NEAR_ANGLE'],
+            'NEAR_RANK': rows['NEAR_RANK']
+        })
         return
 
-    def _get_nearby_points(self):
-        
-        # this references an output created in _get_output_stats (self.output_table) because it was easier to code, so it should be implemented after _get_output_stats is run.
+    def _lookup_result_cache(self):
 
-        self.Nearby_points_path = rf"{self.path_to_gdb}\Nearby_points{rtkMachine.times_already_run}"
-        
-        input_fc = self.usable_realtime
-        output_fc = self.Nearby_points_path
+        # looks up the centroid of every flight feature in the result cache (after emptying it if the station catalog changed).
+        # Creates .cache_keys, .cached_near (the cached rows of each centroid, or None) and .cache_misses (True for the centroids that still need a query).
 
-        # get the object IDs of the nearby points
-        list_of_nears = self.output_table['OBJECTID'].to_list()
+        self.result_cache.validate(self.catalog)
+        status_hash = rtkResultCache.status_hash(self.realtime_table['pnum'].to_numpy(), self.realtime_table['status'].to_numpy())
+        self.cache_keys = [self.result_cache.key(lon, lat, self.num_close, status_hash) for lon, lat in zip(self.center_lon, self.center_lat)]
+        self.cached_near = [self.result_cache.get(key) for key in self.cache_keys]
+        self.cache_misses = np.array([rows is None for rows in self.cached_near], dtype = bool)
+        return
 
-        # this is creating an SQL query
-        where_string = f"OBJECTID = {int(list_of_nears[0])}"
-        if len(list_of_nears) > 1:
-            for i in range(len(list_of_nears) - 1):
-                where_string += f" OR OBJECTID = {int(list_of_nears[i+1])}"
+    # The following two methods write the outputs. Each output feature class is created once with all of its fields, then all of its rows are written
+    # (attributes and geometry together) through one insert cursor, from .near_table and .near_stats. They should be run after _get_output_stats.
+    # Like before, the outputs are not added to the lists to be removed / deleted. With shared_outputs = True they are Nearby_points and Nearby_lines (without the run_id),
+    # and every run adds its rows to them, with its run_id in the run_id field.
 
-        arcpy.Select_analysis(input_fc, output_fc, where_clause=where_string)
+    def _output_rows(self):
 
-        # create the fields necessary to have relevant information
-        arcpy.management.AddField(in_table = self.Nearby_points_path, field_name = 'horizontal_error_est', field_type = 'FLOAT')
-        arcpy.management.AddField(in_table = self.Nearby_points_path, field_name = 'vertical_error_est', field_type = 'FLOAT')
-        arcpy.management.AddField(in_table = self.Nearby_points_path, field_name = 'distance_meters', field_type = 'FLOAT')
+        # one row per near table row: the run_id, the flight feature and rank, the OBJECTID of the station in realtime_points as NEAR_FID, then the station attributes and statistics
+        rows = self.near_stats[['flight_OID', 'NEAR_RANK'] + self.realtime_field_names + ['horizontal_error_est', 'vertical_error_est', 'distance_meters']].rename(columns = {'OBJECTID': 'NEAR_FID'})
+        rows.insert(loc = 0, column = 'run_id', value = self.run_id)
+        return rows
 
-        fc = self.Nearby_points_path
+    def _write_nearby_points(self):
 
-        # the following two blocks turn the respective values into dictionaries which are referenced when updating the cursor and inserting into rows
-        list_of_names = self.output_table['pnum'].to_list()
-        list_of_horiz = self.output_table['horizontal_error_est'].to_list()
-        list_of_vert = self.output_table['vertical_error_est'].to_list()
-        list_of_dist = self.output_table['distance_meters'].to_list()
+        # the nearby base stations, with all of their attributes (and the status after stations_ok / stations_unavailable) and the estimated errors and distance.
+        name = 'Nearby_points' if self.shared_outputs == True else rf"Nearby_points{self.run_id}"
+        rows = self._output_rows()
+        fields = [_output_field(column, rows[column]) for column in rows.columns]
+        self.Nearby_points_path = _prepare_output_class(self.path_to_gdb, name, 'POINT', fields, append = self.shared_outputs)
 
-        horiz_dict = dict(zip(list_of_names, list_of_horiz))
-        vert_dict = dict(zip(list_of_names, list_of_vert))
-        dist_dict = dict(zip(list_of_names, list_of_dist))
+        wgs84 = arcpy.SpatialReference(4326)
+        shapes = (arcpy.PointGeometry(arcpy.Point(x, y), wgs84) for x, y in zip(self.near_table['NEAR_X'].tolist(), self.near_table['NEAR_Y'].tolist()))
+        _insert_rows(self.Nearby_points_path, shapes, rows)
+        return
 
-        # the following three blocks update the field with the respective associated value of the Nearby_points feature class.
-        
-        fields = ['pnum','horizontal_error_est']
-        with arcpy.da.UpdateCursor(fc,fields) as cursor:
-            for row in cursor:
-                name = row[0]
-                if name in list_of_names:
-                    row[1] = horiz_dict[name]
-                    cursor.updateRow(row)
-                
-        fields = ['pnum','vertical_error_est']
-        with arcpy.da.UpdateCursor(fc,fields) as cursor:
-            for row in cursor:
-                name = row[0]
-                if name in list_of_names:
-                    row[1] = vert_dict[name]
-                    cursor.updateRow(row)
-                
-        fields = ['pnum','distance_meters']
-        with arcpy.da.UpdateCursor(fc,fields) as cursor:
-            for row in cursor:
-                name = row[0]
-                if name in list_of_names:
-                    row[1] = dist_dict[name]
-                    cursor.updateRow(row)
+    def _write_nearby_lines(self):
+
+        # the lines from the centerpoint of the flight feature to each of its nearby base stations, with the fields needed to tell them apart.
+        name = 'Nearby_lines' if self.shared_outputs == True else rf"Nearby_lines{self.run_id}"
+        rows = self._output_rows()[['run_id', 'flight_OID', 'NEAR_RANK', 'NEAR_FID', 'pnum', 'horizontal_error_est', 'vertical_error_est', 'distance_meters']]
+        fields = [_output_field(column, rows[column]) for column in rows.columns]
+        self.near_lines_path = _prepare_output_class(self.path_to_gdb, name, 'POLYLINE', fields, append = self.shared_outputs)
 
+        wgs84 = arcpy.SpatialReference(4326)
+        ends = zip(self.near_table['FROM_X'].tolist(), self.near_table['FROM_Y'].tolist(), self.near_table['NEAR_X'].tolist(), self.near_table['NEAR_Y'].tolist())
+        shapes = (arcpy.Polyline(arcpy.Array([arcpy.Point(from_x, from_y), arcpy.Point(near_x, near_y)]), wgs84) for from_x, from_y, near_x, near_y in ends)
+        _insert_rows(self.near_lines_path, shapes, rows)
         return
 
-    def _get_output_stats(self):
+    def _get_output_stats(self, batch = False):
 
-        # this method creates the .output_table attribute and will print relevant information about the nearby points.
+        # this method creates the .output_table attribute. The stations are joined onto the near table once on NEAR_FID, and the error and direction columns are computed for all rows at once.
+        # In batch mode the flight_OID and NEAR_RANK columns are kept, so the rows can be told apart by flight feature.
         
-        realtimefields = arcpy.ListFields(self.usable_realtime)
-        realtime_field_names = []
-        for field in realtimefields:
-            realtime_field_names.append(field.baseName)
-        realtime_field_names.remove('Shape')
+        self.near_stats = _build_near_stats(self.near_table, self.realtime_table)
 
-        near_table_np = arcpy.da.TableToNumPyArray(in_table = self.near_table_path, field_names = ["OBJECTID", "NEAR_FID", "NEAR_RANK", "NEAR_DIST", "NEAR_ANGLE"])
-        realtime_np = arcpy.da.FeatureClassToNumPyArray(in_table = self.usable_realtime, field_names = realtime_field_names)
+        key_columns = ['flight_OID', 'NEAR_RANK'] if batch == True else []
+        self.output_table = self.near_stats[key_columns + self.realtime_field_names + ['horizontal_error_est', 'vertical_error_est', 'distance_meters']]
 
-        near_table_pd = pd.DataFrame(near_table_np)
-        realtime_pd = pd.DataFrame(realtime_np)
+        if self.print_output == True:
+            self._print_output_stats(batch = batch)
+        return
 
-        init_pd = pd.DataFrame()
-        for i in range(len(near_table_pd)):
-            
-            nearpoint = near_table_pd.iloc[i]
-            nearpoint_info = realtime_pd[realtime_pd['OBJECTID'] == nearpoint['NEAR_FID']]
-            nearpoint_name = nearpoint_info['pnum'].iloc[0]
-            nearpoint_error_horizontal = 8 + ((nearpoint['NEAR_DIST']*1.)/1000)
-            nearpoint_error_vertical = 15 + ((nearpoint['NEAR_DIST']*1.)/1000)
-            
-            nearpoint_angle = nearpoint['NEAR_ANGLE']
-            nearpoint_direction = 'Invalid placeholder string. If you see this, something went wrong with the direction calculation but this does not interrupt process'
-        
-            # these calculations are only valid if the method for the generate near table is geodesic. if it is modified to use planar, meanings of angles change.
-            if 112.5 <= nearpoint_angle <= 157.5:
-                nearpoint_direction = 'Southeast'
-            if 67.5 < nearpoint_angle < 112.5:
-                nearpoint_direction = 'East'
-            if 22.5 <= nearpoint_angle <= 67.5:
-                nearpoint_direction = 'Northeast'
-            if -22.5 < nearpoint_angle < 22.5:
-                nearpoint_direction = 'North'
-            if -67.5 <= nearpoint_angle <= -22.5:
-                nearpoint_direction = 'Northwest'
-            if -112.5 < nearpoint_angle < -67.6:
-                nearpoint_direction = 'West'
-            if -157.5 <= nearpoint_angle <= -112.5:
-                nearpoint_direction = 'Southwest'
-            if (nearpoint_angle < -157.5) or (nearpoint_angle > 157.5):
-                nearpoint_direction = 'South'
-                
+    def _print_output_stats(self, batch = False):
+
+        # optional reporting step, prints relevant information about the nearby points in .near_stats.
+        # In batch mode only a summary is printed, as there can be hundreds of flight features.
+
+        if batch == True:
             print('\n')
-            print(f"The nearest base station by a rank of {int(nearpoint['NEAR_RANK'])} is {nearpoint_name} at a distance of {round(nearpoint['NEAR_DIST'], 2)} meters to the {nearpoint_direction}.")
-            print(f"Estimated Horizontal Error: {nearpoint_error_horizontal} milimeters. Estimated Vertical Error: {nearpoint_error_vertical} milimeters.")
+            print(f"Evaluated {self.near_stats['flight_OID'].nunique()} flight features, {len(self.near_stats)} nearby points in total.")
+            print('Information for all flight features and points accessible through .output_table object attribute.')
+            return
+
+        for nearpoint in self.near_stats.itertuples(index = False):
+            print('\n')
+            print(f"The nearest base station by a rank of {int(nearpoint.NEAR_RANK)} is {nearpoint.pnum} at a distance of {round(nearpoint.distance_meters, 2)} meters to the {nearpoint.direction}.")
+            print(f"Estimated Horizontal Error: {nearpoint.horizontal_error_est} milimeters. Estimated Vertical Error: {nearpoint.vertical_error_est} milimeters.")
 
-            # the following three lines insert the respective values into the output table, creating new columns at the specified location
-            nearpoint_info.insert(loc = 20, column = 'horizontal_error_est', value = nearpoint_error_horizontal)
-            nearpoint_info.insert(loc = 21, column = 'vertical_error_est', value = nearpoint_error_vertical)
-            nearpoint_info.insert(loc = 22, column = 'distance_meters', value = nearpoint['NEAR_DIST'])
-            
-            init_pd = pd.concat([init_pd, nearpoint_info])
-            
         print('\n')
         print('Information for all points accessible through .output_table object attribute.')
-        self.output_table = init_pd
-
         return
 
     def _remove_working_layers(self):
 
-        # this method removes the working layers (not the nearby lines or nearby points) from the active map. They may be re-added if still present in the geodatabse.
-
-        list_of_layernames_indexed = []
-        for layer in self.mp.listLayers():
-            name = layer.longName
-            list_of_layernames_indexed.append(name)
-
-        bad_layers = self.working_layer_names
+        # this method removes the working layers (not the nearby lines or nearby points) from the active map, in one pass over its layers (see rtkScratchWorkspace).
+        # They may be re-added if still present in the workspace.
+        self.scratch.remove_tracked_layers()
+        return
 
-        layer_idxs_to_remove = []
-        for item in bad_layers:
-            idx_of_item = [idx for idx in range(len(list_of_layernames_indexed)) if list_of_layernames_indexed[idx] == item][0]
-            layer_idxs_to_remove.append(idx_of_item)
+    def _delete_working_layers_from_gdb(self):
 
-        idx = 0
-        for layer in self.mp.listLayers():
-            if idx in layer_idxs_to_remove:
-                self.mp.removeLayer(layer)
-            idx +=1
-        arcpy.Delete_management(rf"flight_centerpoint_near_realtime_ok_table{rtkMachine.times_already_run}") 
+        # this method deletes the working objects (not the nearby lines or nearby points) permanently from the scratch workspace, with one Delete call
+        self.scratch.delete_tracked_objects()
         return
 
-    def _delete_working_layers_from_gdb(self):
+    def _compact_gdb(self):
 
-    # this method deletes the working layers (not the nearby lines or nearby points) permanently from the geodatabase
-        
-        for fc in self.fc_Delete:
-            if arcpy.Exists(fc):
-                arcpy.Delete_management(fc,"")
-        arcpy.Delete_management(self.near_table_path)
+        # compacts the gdb, so it does not keep growing over many runs
+        self.scratch.compact_gdb()
         return
\ No newline at end of file
@@ -0,0 +1,384 @@
+### Local query service for the rtkMachine. The station catalog and station index are loaded once and kept in memory, so a nearest-station request is answered in
+# about a millisecond instead of a geoprocessing run. Requests arriving within batch_window_ms of each other are answered with one station index query (micro-batching).
+#
+# Start it from the repository folder, over HTTP or a Unix socket:
+#     python rtkService.py --realtime /data/stations.rtksnap --port 8765
+#     python rtkService.py --realtime /data/stations.rtksnap --unix /tmp/rtk.sock
+#
+# Endpoints:
+#     POST /near       body: {"coordinates": [lon, lat] or [[lon, lat], ...]} or {"geometry": GeoJSON FeatureCollection / Feature / geometry},
+#                      plus optional "num_close" (default 1), "stations_ok" and "stations_unavailable" (lists of pnum names).
+#                      Returns {"rows": [...], "elapsed_ms": ...}, with one row per flight feature and nearby station and the same columns as .output_table of rtkMachine.run_batch.
+#     GET /metrics     request and error counts, batch sizes, latency percentiles, and throughput
+#     GET /health      {"status": "ok"} once the stations are loaded
+#
+# With a station snapshot (see rtkStationCatalog.to_snapshot) the service runs without arcpy, for example on a Linux server.
+# With --status-feed, the station status is refreshed from a feed file every --refresh-seconds (see rtkStatusRefresher), applying only the stations that changed.
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from rtkMachine_v1 import rtkResultCache, rtkStationCatalog, rtkStatusRefresher, _apply_status_overrides, _build_near_stats, _geometry_centroid, _read_flight_geometry
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+class rtkService:
+
+    # max_concurrency is the most requests answered at once, and max_pending the most waiting for a turn; requests beyond that get a 503 right away instead of queueing without bound.
+    # Requests with the same num_close and the same effective station status are gathered for up to batch_window_ms (or until max_batch_size of them are waiting) and answered together.
+    # The station index of every effective station status (after stations_ok / stations_unavailable) is kept for later requests, up to max_status_sets of them, least recently used dropped first.
+
+    def __init__(self,
+                 path_to_realtime: str,
+                 max_concurrency: int = 256,
+                 max_pending: int = 4096,
+                 batch_window_ms: float = 1.0,
+                 max_batch_size: int = 512,
+                 max_status_sets: int = 16,
+                 max_body_bytes: int = 1_000_000,
+                 latency_window: int = 10000,
+                 path_to_feed: str = None,
+                 refresh_seconds: float = 60.0
+        ) -> None:
+
+        self.catalog = rtkStationCatalog.load(path_to_realtime)
+        self.realtime_table = self.catalog.to_frame()
+        self.pnum = self.realtime_table['pnum'].to_numpy()
+        self.output_columns = ['flight_OID', 'NEAR_RANK'] + list(self.catalog.field_names) + ['horizontal_error_est', 'vertical_error_est', 'distance_meters']
+
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_status_sets = max_status_sets
+        self.max_body_bytes = max_body_bytes
+
+        # with a status feed, its refresher holds the current status and the station index without overrides, updated in place by every refresh
+        self.status_feed = None
+        self.refresh_seconds = refresh_seconds
+        self.refresh_errors = 0
+        if path_to_feed is not None:
+            self.status_feed = rtkStatusRefresher(self.catalog, path_to_feed)
+            self.status_feed.refresh()
+
+        # effective station status -> (station index, realtime table with that status), and (stations_ok, stations_unavailable) -> status hash, both LRU
+        self.status_sets = OrderedDict()
+        self.override_keys = OrderedDict()
+        self._status_set([], [])
+
+        # micro-batching state, owned by the event loop
+        self.semaphore = None
+        self.pending = []
+        self.flush_handle = None
+
+        # metrics
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.batches = 0
+        self.latencies = deque(maxlen = latency_window)
+        self.batch_sizes = deque(maxlen = latency_window)
+        self.completion_times = deque(maxlen = latency_window)
+        return
+
+    def _status_set(self, stations_ok, stations_unavailable):
+
+        # the (station index, realtime table) for the station status after stations_ok and stations_unavailable, built the first time it is asked for.
+        # Without overrides, a status feed's own index is used, as it is kept up to date by the refreshes.
+        if (self.status_feed is not None) and (len(stations_ok) == 0) and (len(stations_unavailable) == 0):
+            return 'status_feed', (self.status_feed.station_index, self.status_feed.realtime_table)
+
+        # override keys are kept longer than status sets, so the status set of a known override key may have been dropped already. It is then built again.
+        override_key = (tuple(stations_ok), tuple(stations_unavailable))
+        status_key = self.override_keys.get(override_key)
+        if (status_key is None) or (status_key not in self.status_sets):
+            base_status = self.catalog.columns['status'] if self.status_feed is None else self.status_feed.status
+            status = _apply_status_overrides(self.pnum, base_status, stations_ok, stations_unavailable, print_changes = False)
+            status_key = rtkResultCache.status_hash(self.pnum, status)
+            if status_key not in self.status_sets:
+                realtime_table = self.realtime_table.copy()
+                realtime_table['status'] = status
+                self.status_sets[status_key] = (self.catalog.station_index(status = status), realtime_table)
+            self.override_keys[override_key] = status_key
+            while len(self.override_keys) > 4 * self.max_status_sets:
+                self.override_keys.popitem(last = False)
+
+        self.override_keys.move_to_end(override_key)
+        self.status_sets.move_to_end(status_key)
+        while len(self.status_sets) > self.max_status_sets:
+            self.status_sets.popitem(last = False)
+        return status_key, self.status_sets[status_key]
+
+    def _parse_query(self, body):
+
+        # checks a /near request body and returns (batch key, station index, realtime table, num_close, flight_OID, lon, lat). Raises an Exception with a message for the client if it is not valid.
+        query = json.loads(body)
+        if type(query) is not dict:
+            raise Exception("the request body needs to be a JSON object")
+
+        num_close = query.get('num_close', 1)
+        stations_ok = query.get('stations_ok', [])
+        stations_unavailable = query.get('stations_unavailable', [])
+        if (type(num_close) is not int) or (num_close < 1):
+            raise Exception("num_close needs to be a positive integer")
+        for name, stations in (('stations_ok', stations_ok), ('stations_unavailable', stations_unavailable)):
+            if (type(stations) is not list) or (not all(type(station) is str for station in stations)):
+                raise Exception(f"{name} needs to be a list of station names as strings")
+
+        # only inline geometry is accepted, never a file path
+        if ('coordinates' in query) and (type(query['coordinates']) is list):
+            features = _read_flight_geometry(query['coordinates'])
+        elif ('geometry' in query) and (type(query['geometry']) is dict):
+            features = _read_flight_geometry(query['geometry'])
+        else:
+            raise Exception("the request needs 'coordinates' (a [lon, lat] pair or a list of them) or 'geometry' (a GeoJSON object)")
+
+        status_key, (station_index, realtime_table) = self._status_set(stations_ok, stations_unavailable)
+        if num_close > int(station_index.active.sum()):
+            raise Exception(f"num_close is {num_close}, but only {int(station_index.active.sum())} stations are OK")
+
+        centroids = np.array([_geometry_centroid(geometry) for fid, geometry in features], dtype = np.float64).reshape(-1, 2)
+        flight_oids = np.array([fid for fid, geometry in features])
+        return (status_key, num_close), station_index, realtime_table, num_close, flight_oids, centroids[:, 0], centroids[:, 1]
+
+    async def query(self, body):
+
+        # answers one /near request body (bytes or str), returning its rows as a pandas DataFrame. The request waits for the next batch to be flushed.
+        return await self._submit(self._parse_query(body))
+
+    async def _submit(self, parsed_query):
+
+        batch_key, station_index, realtime_table, num_close, flight_oids, lon, lat = parsed_query
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((batch_key, station_index, realtime_table, num_close, flight_oids, lon, lat, future))
+
+        if len(self.pending) >= self.max_batch_size:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self):
+
+        # answers every waiting request: one station index query and one station join per group of requests with the same num_close and station status
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        pending, self.pending = self.pending, []
+
+        groups = {}
+        for item in pending:
+            groups.setdefault(item[0], []).append(item)
+
+        for items in groups.values():
+            self.batches += 1
+            self.batch_sizes.append(len(items))
+            station_index, realtime_table, num_close = items[0][1], items[0][2], items[0][3]
+            try:
+                near_table = station_index.near_table(
+                    lon = np.concatenate([item[5] for item in items]),
+                    lat = np.concatenate([item[6] for item in items]),
+                    k = num_close,
+                    in_fids = np.concatenate([item[4] for item in items])
+                )
+                rows = _build_near_stats(near_table, realtime_table)[self.output_columns]
+            except Exception as exception:
+                for item in items:
+                    if not item[7].done():
+                        item[7].set_exception(exception)
+                continue
+
+            # near table rows are in query point order, with the same number of rows for every point, so every request's rows are one slice.
+            # That is num_close, unless a status feed refresh since the requests were parsed left fewer OK stations, which clips k.
+            rows_per_point = len(near_table) // sum(len(item[5]) for item in items)
+            end = 0
+            for item in items:
+                start, end = end, end + len(item[5]) * rows_per_point
+                if not item[7].done():
+                    item[7].set_result(rows.iloc[start:end])
+        return
+
+    def metrics(self):
+
+        latencies = np.array(self.latencies) * 1000
+        now = time.monotonic()
+        uptime = now - self.started
+        last_minute = sum(1 for completed in self.completion_times if completed > now - 60)
+        return {
+            'uptime_seconds': round(uptime, 3),
+            'stations': len(self.catalog),
+            'status_sets': len(self.status_sets),
+            'status_feed': None if self.status_feed is None else {
+                'refreshes': self.status_feed.refreshes,
+                'refresh_errors': self.refresh_errors,
+                'last_refresh': self.status_feed.last_refresh,
+                'ok_stations': int(self.status_feed.station_index.active.sum())
+            },
+            'requests': self.requests,
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'in_flight': self.in_flight,
+            'batches': self.batches,
+            'mean_batch_size': round(float(np.mean(self.batch_sizes)), 3) if len(self.batch_sizes) > 0 else None,
+            'latency_ms': {
+                'mean': round(float(latencies.mean()), 3),
+                'p50': round(float(np.percentile(latencies, 50)), 3),
+                'p95': round(float(np.percentile(latencies, 95)), 3),
+                'p99': round(float(np.percentile(latencies, 99)), 3),
+                'max': round(float(latencies.max()), 3)
+            } if len(latencies) > 0 else None,
+            'throughput_per_second': {
+                'overall': round(self.requests / uptime, 3) if uptime > 0 else None,
+                'last_minute': round(last_minute / min(60, uptime), 3) if uptime > 0 else None
+            }
+        }
+
+    async def _route(self, method, target, body):
+
+        # returns (HTTP status, JSON response text)
+        path = target.split('?')[0]
+        if path == '/health':
+            return 200, json.dumps({'status': 'ok'})
+        if path == '/metrics':
+            return 200, json.dumps(self.metrics())
+        if path != '/near':
+            return 404, json.dumps({'error': f"no endpoint {path}. Use POST /near, GET /metrics or GET /health"})
+        if method != 'POST':
+            return 405, json.dumps({'error': "/near needs a POST request"})
+
+        started = time.perf_counter()
+        self.requests += 1
+        if self.in_flight >= self.max_concurrency + self.max_pending:
+            self.rejected += 1
+            return 503, json.dumps({'error': "too many requests waiting, try again shortly"})
+
+        self.in_flight += 1
+        try:
+            async with self.semaphore:
+                try:
+                    parsed_query = self._parse_query(body)
+                except Exception as exception:
+                    self.errors += 1
+                    return 400, json.dumps({'error': str(exception)})
+                try:
+                    rows = await self._submit(parsed_query)
+                except Exception as exception:
+                    self.errors += 1
+                    return 500, json.dumps({'error': str(exception)})
+            elapsed = time.perf_counter() - started
+            self.latencies.append(elapsed)
+            self.completion_times.append(time.monotonic())
+            return 200, f'{{"rows": {rows.to_json(orient = "records")}, "elapsed_ms": {round(elapsed * 1000, 3)}}}'
+        finally:
+            self.in_flight -= 1
+
+    async def _handle_connection(self, reader, writer):
+
+        # a minimal HTTP/1.1 server: one request after another on each connection (keep-alive), with a Content-Length body
+        try:
+            while True:
+                request_line = await reader.readline()
+                if len(request_line) == 0:
+                    break
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    break
+                method, target, version = parts
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0) or 0)
+                if length > self.max_body_bytes:
+                    status, payload = 413, json.dumps({'error': f"request bodies are limited to {self.max_body_bytes} bytes"})
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length > 0 else b''
+                    status, payload = await self._route(method, target, body)
+                    keep_alive = (version == 'HTTP/1.1') and (headers.get('connection', '').lower() != 'close')
+
+                content = payload.encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(content)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive == True else 'close'}\r\n\r\n".encode('latin-1') + content
+                )
+                await writer.drain()
+                if keep_alive == False:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+        return
+
+    async def start(self, host = '127.0.0.1', port = 8765, unix_path = None):
+
+        # starts listening (on unix_path if given, otherwise on host:port) and returns the asyncio server
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.status_feed is not None:
+            self.refresh_task = asyncio.get_running_loop().create_task(self._refresh_loop())
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self._handle_connection, path = unix_path)
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def _refresh_loop(self):
+
+        # refreshes the status feed every refresh_seconds. Indexes built for status overrides start from the old status, so they are dropped when anything changed.
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                changes = self.status_feed.refresh()
+            except Exception:
+                self.refresh_errors += 1
+                continue
+            if len(changes) > 0:
+                self.status_sets.clear()
+                self.override_keys.clear()
+
+    async def serve(self, host = '127.0.0.1', port = 8765, unix_path = None):
+        server = await self.start(host = host, port = port, unix_path = unix_path)
+        async with server:
+            await server.serve_forever()
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = "Serve nearest base station and RTK error estimates from memory, over HTTP or a Unix socket.")
+    parser.add_argument('--realtime', required = True, help = "path to the realtime_points feature class, or to a station snapshot folder (no arcpy needed)")
+    parser.add_argument('--host', default = '127.0.0.1', help = "address to listen on for HTTP")
+    parser.add_argument('--port', type = int, default = 8765, help = "port to listen on for HTTP")
+    parser.add_argument('--unix', help = "listen on this Unix socket path instead of host and port")
+    parser.add_argument('--max-concurrency', type = int, default = 256, help = "most requests answered at once")
+    parser.add_argument('--max-pending', type = int, default = 4096, help = "most requests waiting for a turn before new ones are rejected with 503")
+    parser.add_argument('--batch-window-ms', type = float, default = 1.0, help = "how long a request waits for others to be answered with it")
+    parser.add_argument('--max-batch-size', type = int, default = 512, help = "a batch is answered right away once this many requests are waiting")
+    parser.add_argument('--status-feed', help = "CSV or JSON station status feed to refresh the station status from (see rtkStatusRefresher)")
+    parser.add_argument('--refresh-seconds', type = float, default = 60.0, help = "how often the status feed is refreshed")
+    args = parser.parse_args(argv)
+
+    service = rtkService(args.realtime, max_concurrency = args.max_concurrency, max_pending = args.max_pending, batch_window_ms = args.batch_window_ms, max_batch_size = args.max_batch_size, path_to_feed = args.status_feed, refresh_seconds = args.refresh_seconds)
+    print(f"Loaded {len(service.catalog)} stations. Serving on {args.unix if args.unix is not None else f'http://{args.host}:{args.port}'}")
+    try:
+        asyncio.run(service.serve(host = args.host, port = args.port, unix_path = args.unix))
+    except KeyboardInterrupt:
+        pass
+    return
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+### Shared setup for the tests, which run without ArcGIS Pro against the arcpy stand-in in benchmarks/fake_arcpy (put in front of any real arcpy).
+
+import os
+import sys
+
+TESTS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_FOLDER = os.path.dirname(TESTS_FOLDER)
+sys.path.insert(0, os.path.join(REPOSITORY_FOLDER, 'benchmarks', 'fake_arcpy'))
+sys.path.insert(1, os.path.join(REPOSITORY_FOLDER, 'benchmarks'))
+sys.path.insert(2, REPOSITORY_FOLDER)
+
+import arcpy
+import pytest
+from rtkMachine_v1 import rtkMachine, rtkStationCatalog
+
+@pytest.fixture(autouse = True)
+def fresh_session():
+    # every test starts like a new ArcGIS Pro session: no datasets or layers, no cached station catalog, and no earlier runs
+    arcpy.reset()
+    rtkStationCatalog.clear_cache()
+    rtkMachine.times_already_run = 0
+    yield
+    arcpy.reset()
+    rtkStationCatalog.clear_cache()
@@ -0,0 +1,50 @@
+### Tests of rtkMachine runs on small synthetic station networks (see benchmarks/rtkBenchmark.py)
+
+import arcpy
+from rtkBenchmark import make_station_network
+from rtkMachine_v1 import rtkMachine, rtkResultCache
+
+# a C-shaped polygon: its true centroid (-110.3, 42.0) is in the notch, outside the polygon, where its label point is not
+C_SHAPE = [(-112, 40), (-108, 40), (-108, 41), (-111, 41), (-111, 43), (-108, 43), (-108, 44), (-112, 44), (-112, 40)]
+
+def make_c_shape(folder):
+    path = str(folder / 'c_shape')
+    arcpy.create_dataset(path, 'Polygon', {'name': ['c_shape']}, [arcpy.make_geometry('Polygon', [C_SHAPE])], add_layer = False)
+    return path
+
+def test_result_cache_does_not_change_concave_polygon_result(tmp_path):
+    path_to_gdb = make_station_network(str(tmp_path), 300)
+    path_to_flight = make_c_shape(tmp_path)
+
+    uncached = rtkMachine(path_to_gdb, path_to_flight, num_close = 5, print_output = False)
+    uncached.run()
+    result_cache = rtkResultCache()
+    cached = rtkMachine(path_to_gdb, path_to_flight, num_close = 5, print_output = False, result_cache = result_cache)
+    cached.run()
+
+    assert (cached.center_lon[0], cached.center_lat[0]) == (uncached.center_lon[0], uncached.center_lat[0])
+    assert cached.output_table['pnum'].tolist() == uncached.output_table['pnum'].tolist()
+    assert cached.output_table['distance_meters'].tolist() == uncached.output_table['distance_meters'].tolist()
+
+    # a second cached run of the same site is found in the cache, with the same result
+    again = rtkMachine(path_to_gdb, path_to_flight, num_close = 5, print_output = False, result_cache = result_cache)
+    again.run()
+    assert result_cache.hits == 1
+    assert again.output_table['pnum'].tolist() == uncached.output_table['pnum'].tolist()
+
+def test_shared_outputs_runs_of_separate_sessions_get_distinct_run_ids(tmp_path):
+    path_to_gdb = make_station_network(str(tmp_path), 300)
+    path_to_flight = make_c_shape(tmp_path)
+
+    run_ids = []
+    for session in range(2):
+        # every session counts its runs from 1 again
+        rtkMachine.times_already_run = 0
+        machine = rtkMachine(path_to_gdb, path_to_flight, num_close = 3, print_output = False, shared_outputs = True)
+        machine.run()
+        run_ids.append(machine.run_id)
+
+    assert run_ids[0] != run_ids[1]
+    for name in ('Nearby_points', 'Nearby_lines'):
+        rows = arcpy.da.TableToNumPyArray(rf"{path_to_gdb}\{name}", ['run_id'])
+        assert sorted(rows['run_id'].tolist()) == sorted(run_ids * 3)
@@ -0,0 +1,31 @@
+### Tests of rtkService request batching, on a small synthetic station network (see benchmarks/rtkBenchmark.py)
+
+import asyncio
+import json
+
+import numpy as np
+from rtkBenchmark import make_station_network
+from rtkService import rtkService
+
+def test_batched_requests_keep_their_own_rows_when_k_is_clipped(tmp_path):
+    path_to_gdb = make_station_network(str(tmp_path), 50)
+    service = rtkService(rf"{path_to_gdb}\realtime_points", batch_window_ms = 50)
+    requests = [json.dumps({'coordinates': coordinates, 'num_close': 3}) for coordinates in ([-120.0, 45.0], [-105.0, 33.0], [-112.0, 40.0])]
+
+    # a status feed refresh between parsing and flushing leaves only two OK stations, so every point gets two rows instead of num_close
+    parsed = [service._parse_query(body) for body in requests]
+    station_index = parsed[0][1]
+    station_index.set_active(np.flatnonzero(station_index.active)[2:], False)
+
+    async def answer():
+        return await asyncio.gather(*(service._submit(item) for item in parsed))
+
+    answers = asyncio.run(answer())
+
+    assert service.batches == 1
+    for item, rows in zip(parsed, answers):
+        expected = station_index.near_table(lon = item[5], lat = item[6], k = 3, in_fids = item[4])
+        expected_pnum = service.realtime_table.set_index('OBJECTID').loc[expected['NEAR_FID'], 'pnum']
+        assert len(rows) == 2
+        assert rows['pnum'].tolist() == expected_pnum.tolist()
+        assert np.allclose(rows['distance_meters'], expected['NEAR_DIST'])
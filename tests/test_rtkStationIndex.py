@@ -0,0 +1,26 @@
+### Tests of the in-process nearest-station engine against brute force geodesic distances
+
+import numpy as np
+from rtkMachine_v1 import _geodesic_inverse, rtkLookupGrid, rtkStationIndex
+
+def test_query_is_exact_with_many_stations_nearly_tied():
+    # a dense ring of stations at the same distance on the sphere from (-110, 45), among scattered stations. On the ellipsoid their distances differ by a few hundred meters,
+    # so more than candidate_margin of them compete for the last ranks.
+    rng = np.random.default_rng(3)
+    azimuths = np.linspace(0, 2 * np.pi, 200, endpoint = False)
+    center_lat, angle = np.radians(45.0), 0.01
+    ring_lat = np.arcsin(np.sin(center_lat) * np.cos(angle) + np.cos(center_lat) * np.sin(angle) * np.cos(azimuths))
+    ring_lon = np.radians(-110.0) + np.arctan2(np.sin(azimuths) * np.sin(angle) * np.cos(center_lat), np.cos(angle) - np.sin(center_lat) * np.sin(ring_lat))
+    lon = np.concatenate([np.degrees(ring_lon), rng.uniform(-125, -100, 3000)])
+    lat = np.concatenate([np.degrees(ring_lat), rng.uniform(30, 50, 3000)])
+    query_lon = np.concatenate([[-110.0], rng.uniform(-125, -100, 200)])
+    query_lat = np.concatenate([[45.0], rng.uniform(30, 50, 200)])
+
+    station_index = rtkStationIndex(lon, lat)
+    brute_force = np.sort(_geodesic_inverse(query_lon[:, None], query_lat[:, None], lon[None, :], lat[None, :])[0], axis = 1)
+    for k in (1, 20, 40):
+        _, distances, _ = station_index.query(query_lon, query_lat, k)
+        assert np.allclose(distances, brute_force[:, :k], rtol = 0, atol = 1e-3)
+
+    _, distances, _ = rtkLookupGrid(station_index, depth = 16).query(query_lon, query_lat, 10)
+    assert np.allclose(distances, brute_force[:, :10], rtol = 0, atol = 1e-3)